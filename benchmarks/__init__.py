@@ -0,0 +1,8 @@
+"""Benchmarks of the Pulsar integration
+
+    python -m benchmarks --output bench.json
+    python -m benchmarks --baseline bench.json --threshold 0.3
+
+The second form fails when a hot path got slower than the baseline by more
+than the threshold.
+"""
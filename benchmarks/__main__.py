@@ -0,0 +1,64 @@
+"""Runs the benchmarks, writes the results and checks them against a baseline"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+
+from custom_components.pulsar.connector import AsyncConnector
+from custom_components.pulsar.pulsar_m_water import PulsarM
+from custom_components.pulsar.scheduler import BusScheduler
+from pulsar_simulator import Faults
+
+from . import bus_bench, codec_bench, results
+
+# above the spread of the best codec rates between runs of the same code
+DEFAULT_THRESHOLD = 0.3
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks", description="Benchmarks of the Pulsar integration")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="slowdown of a hot path that fails the run, 0.3 is 30%%")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="reply latency of the simulated meters in seconds")
+    parser.add_argument("--skip-bus", action="store_true",
+                        help="only run the codec benchmarks")
+    return parser.parse_args(argv)
+
+
+def _device() -> PulsarM:
+    # the helpers under test never touch the bus, so it is never opened
+    connector = AsyncConnector("127.0.0.1:1", "bench")
+    return PulsarM(BusScheduler(connector), "bench", bus_bench.FIRST_ADDR)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+
+    measured = codec_bench.run(_device())
+    if not args.skip_bus:
+        measured += asyncio.run(bus_bench.async_run(Faults(latency=args.latency)))
+
+    baseline = results.load(args.baseline) if args.baseline else {}
+    for result in measured:
+        line = f"{result.name:36} {result.value:14.1f} {result.unit}"
+        if (base := baseline.get(result.name)) is not None and result.gated:
+            line += f"  ({-result.slowdown(base):+.1%})"
+        print(line)
+
+    if args.output:
+        results.dump(measured, args.output)
+
+    slower = results.regressions(measured, baseline, args.threshold)
+    for result, slowdown in slower:
+        print(f"REGRESSION {result.name} is {slowdown:.1%} slower than the baseline",
+              file=sys.stderr)
+    return 1 if slower else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
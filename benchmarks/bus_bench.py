@@ -0,0 +1,94 @@
+"""End-to-end benchmarks against simulated meters on the loopback interface"""
+from __future__ import annotations
+
+import asyncio
+import statistics
+import time
+
+from custom_components.pulsar import codec
+from custom_components.pulsar.connector import AsyncConnector
+from custom_components.pulsar.const import (
+    DATA_KEY_CURRENT_WATER_CONSUMPTION_CH1,
+    DATA_KEY_DEVICE_TEMPERATURE,
+    DATA_KEY_SYSTEM_TIME
+)
+from custom_components.pulsar.pulsar_m_water import PulsarM
+from custom_components.pulsar.scheduler import BusScheduler
+from pulsar_simulator import Faults, SimulatedBus, VirtualMeter, async_serve_tcp
+
+from .results import Result
+
+FIRST_ADDR = 10000001
+SEND_TRANSACTIONS = 2000
+POLL_CYCLES = 5
+POLL_METER_COUNTS = (1, 10, 100, 500)
+# what a coordinator refresh reads from every meter when all keys are due
+POLL_KEYS = [
+    DATA_KEY_CURRENT_WATER_CONSUMPTION_CH1,
+    DATA_KEY_SYSTEM_TIME,
+    DATA_KEY_DEVICE_TEMPERATURE,
+]
+
+
+async def _async_send_throughput(address: str) -> float:
+    connector = AsyncConnector(address, "bench")
+    try:
+        if not await connector.async_connect():
+            raise Exception(f"cannot connect to {address}")
+        frames = [
+            codec.encode_frame(bytes(4), 0x01, FIRST_ADDR, request_id)
+            for request_id in range(SEND_TRANSACTIONS)
+        ]
+        start = time.perf_counter()
+        for frame in frames:
+            response = await connector.send(frame)
+            if not response:
+                raise Exception("the simulator did not answer")
+        return SEND_TRANSACTIONS / (time.perf_counter() - start)
+    finally:
+        connector.disconnect()
+
+
+async def _async_poll_latency(address: str, meters: int) -> float:
+    """Median time of a refresh reading POLL_KEYS from every meter, in seconds"""
+    connector = AsyncConnector(address, "bench")
+    bus = BusScheduler(connector)
+    devices = [
+        PulsarM(bus, f"meter {addr}", addr)
+        for addr in range(FIRST_ADDR, FIRST_ADDR + meters)
+    ]
+    try:
+        cycles = []
+        for _ in range(POLL_CYCLES):
+            start = time.perf_counter()
+            results = await asyncio.gather(
+                *(device.getdata_many(POLL_KEYS) for device in devices))
+            cycles.append(time.perf_counter() - start)
+            for result in results:
+                for value in result.values():
+                    if isinstance(value, Exception):
+                        raise value
+        return statistics.median(cycles)
+    finally:
+        await bus.async_stop()
+        connector.disconnect()
+
+
+async def async_run(faults: Faults | None = None) -> list[Result]:
+    sim = SimulatedBus(
+        [VirtualMeter(addr) for addr in range(FIRST_ADDR, FIRST_ADDR + max(POLL_METER_COUNTS))],
+        faults)
+    server = await async_serve_tcp(sim)
+    address = f"127.0.0.1:{server.sockets[0].getsockname()[1]}"
+    try:
+        results = [
+            Result("connector.send", await _async_send_throughput(address),
+                   "transactions/s", True, gated=False)
+        ]
+        for meters in POLL_METER_COUNTS:
+            latency = await _async_poll_latency(address, meters)
+            results.append(Result(
+                f"poll_cycle.{meters}_meters", latency * 1000, "ms", False, gated=False))
+        return results
+    finally:
+        server.close()
@@ -0,0 +1,68 @@
+"""Benchmark results and the regression gate"""
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass
+import json
+import platform
+import sys
+from typing import Any
+
+FORMAT_VERSION = 1
+
+
+@dataclass
+class Result:
+    """One measured number"""
+
+    name: str
+    value: float
+    unit: str
+    higher_is_better: bool
+    # only gated results can fail the regression check, end-to-end numbers
+    # depend too much on the machine load
+    gated: bool = True
+
+    def slowdown(self, baseline: Result) -> float:
+        """Returns how much worse than baseline this result is, 0.25 is 25% slower"""
+        if self.higher_is_better:
+            return baseline.value / self.value - 1 if self.value else float("inf")
+        return self.value / baseline.value - 1 if baseline.value else 0.0
+
+
+def dump(results: list[Result], path: str) -> None:
+    data = {
+        "version": FORMAT_VERSION,
+        "python": sys.version.split()[0],
+        "machine": platform.machine(),
+        "results": {result.name: asdict(result) for result in results},
+    }
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(data, file, indent=2)
+
+
+def load(path: str) -> dict[str, Result]:
+    with open(path, encoding="utf-8") as file:
+        data: dict[str, Any] = json.load(file)
+    if data.get("version") != FORMAT_VERSION:
+        raise ValueError(f"{path} has an unknown format")
+    return {name: Result(**result) for name, result in data["results"].items()}
+
+
+def regressions(
+        results: list[Result],
+        baseline: dict[str, Result],
+        threshold: float) -> list[tuple[Result, float]]:
+    """Returns the gated results that are slower than baseline by more than threshold
+
+    Rates are compared as measured, a baseline only means something for
+    the machine it was recorded on.
+    """
+    slower = []
+    for result in results:
+        base = baseline.get(result.name)
+        if base is None or not result.gated:
+            continue
+        slowdown = result.slowdown(base)
+        if slowdown > threshold:
+            slower.append((result, slowdown))
+    return slower
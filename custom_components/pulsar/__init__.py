@@ -7,14 +7,21 @@ import homeassistant.helpers.entity_registry as er
 
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import ConfigEntryNotReady
 from homeassistant.helpers import device_registry as dr
 from homeassistant.helpers.device_registry import DeviceEntry
+from homeassistant.helpers.event import async_track_time_interval
 from homeassistant.helpers.typing import ConfigType
 
+from .archive_sync import PulsarArchiveSync, archive_store
+from .coordinator import PulsarDataUpdateCoordinator
 from .pulsar_manager import PulsarManager
+from .registry import async_get_registry
 
 from .const import (
     CONF_DEVICE_CONFIG,
+    CONF_DEVICE_OR_ADDRESS,
+    DEFAULT_ARCHIVE_SYNC_INTERVAL,
     DATA_PULSAR,
     DATA_PULSAR_CONFIG,
     DOMAIN,
@@ -28,6 +35,8 @@ class HomeAssistantPulsarData(NamedTuple):
     """Pulsar data stored in the Home Assistant data object."""
 
     device_manager: PulsarManager
+    coordinator: PulsarDataUpdateCoordinator
+    archive_sync: PulsarArchiveSync
 
 
 # Internal definitions
@@ -48,28 +57,57 @@ async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up Pulsar."""
 
-    device_manager = PulsarManager(hass, entry)
-
-    hass.data[DOMAIN][entry.entry_id] = HomeAssistantPulsarData(
-        device_manager=device_manager
-    )
-
-    devices = device_manager.get_devices(None)
-
-    device_registry = dr.async_get(hass)
-    for device_id in devices:
-        device = devices[device_id]
-        device_registry.async_get_or_create(
-            config_entry_id=entry.entry_id,
-            identifiers={(DOMAIN, device_id)},
-            manufacturer="Pulsar",
-            name=device.name,
-            model=device._type
+    registry = async_get_registry(hass)
+    connection = await registry.async_acquire(entry.data[CONF_DEVICE_OR_ADDRESS])
+    # nothing here waits for the meters, they are polled in the background
+    if not await connection.connector.async_start():
+        await registry.async_release(connection)
+        raise ConfigEntryNotReady(
+            f"Unable to open {entry.data[CONF_DEVICE_OR_ADDRESS]}")
+    try:
+        device_manager = PulsarManager(hass, entry, connection)
+        coordinator = PulsarDataUpdateCoordinator(hass, device_manager)
+        archive_sync = PulsarArchiveSync(hass, entry, device_manager)
+
+        hass.data[DOMAIN][entry.entry_id] = HomeAssistantPulsarData(
+            device_manager=device_manager,
+            coordinator=coordinator,
+            archive_sync=archive_sync
         )
 
-    entry.async_on_unload(entry.add_update_listener(async_update_listener))
-
-    await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+        devices = device_manager.get_devices(None)
+
+        device_registry = dr.async_get(hass)
+        for device_id in devices:
+            device = devices[device_id]
+            device_registry.async_get_or_create(
+                config_entry_id=entry.entry_id,
+                identifiers={(DOMAIN, device_id)},
+                manufacturer="Pulsar",
+                name=device.name,
+                model=device._type
+            )
+
+        entry.async_on_unload(entry.add_update_listener(async_update_listener))
+
+        await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    except Exception:
+        # the connection is shared, leaving it acquired would keep the port open for good
+        hass.data[DOMAIN].pop(entry.entry_id, None)
+        await registry.async_release(connection)
+        raise
+
+    # Entities are registered and show their restored readings now,
+    # so the first cycle knows which keys to read and nothing waits for it
+    entry.async_create_background_task(
+        hass, coordinator.async_staggered_refresh(), f"{DOMAIN}_first_refresh")
+
+    # Fill the statistics with whatever the meters recorded while we were away
+    entry.async_create_background_task(
+        hass, archive_sync.async_sync(), f"{DOMAIN}_archive_sync")
+    entry.async_on_unload(
+        async_track_time_interval(
+            hass, archive_sync.async_sync, DEFAULT_ARCHIVE_SYNC_INTERVAL))
 
     return True
 
@@ -115,9 +153,16 @@ async def async_remove_config_entry_device(
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
     if unload_ok := await hass.config_entries.async_unload_platforms(entry, PLATFORMS):
-        hass.data[DOMAIN].pop(entry.entry_id)
+        hass_data: HomeAssistantPulsarData = hass.data[DOMAIN].pop(entry.entry_id)
+        await async_get_registry(hass).async_release(
+            hass_data.device_manager.connection)
 
         if not hass.config_entries.async_entries(DOMAIN):
             hass.data.pop(DOMAIN)
 
     return unload_ok
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Remove data stored for a config entry."""
+    await archive_store(hass, entry.entry_id).async_remove()
@@ -0,0 +1,50 @@
+"""Archive records of Pulsar meters"""
+from __future__ import annotations
+
+import datetime
+import enum
+
+from . import codec
+
+# channel number (4) + archive type (2) + time of the first record (6)
+ARCHIVE_HEADER_SIZE = 12
+ARCHIVE_VALUE_SIZE = 4
+MAX_ARCHIVE_RECORDS = (codec.MAX_PAYLOAD_SIZE -
+                       ARCHIVE_HEADER_SIZE) // ARCHIVE_VALUE_SIZE
+
+
+class ArchiveType(enum.IntEnum):
+    """Archive types of function 0x06"""
+
+    hourly = 1
+    daily = 2
+    monthly = 3
+
+    def floor(self, time: datetime.datetime) -> datetime.datetime:
+        """Returns the start of the record period containing time"""
+        time = time.replace(minute=0, second=0, microsecond=0)
+        if self is ArchiveType.hourly:
+            return time
+        time = time.replace(hour=0)
+        if self is ArchiveType.daily:
+            return time
+        return time.replace(day=1)
+
+    def advance(self, time: datetime.datetime, records: int) -> datetime.datetime:
+        """Returns the time of the record that is records after time"""
+        if self is ArchiveType.hourly:
+            return time + datetime.timedelta(hours=records)
+        if self is ArchiveType.daily:
+            return time + datetime.timedelta(days=records)
+        months = time.year * 12 + time.month - 1 + records
+        return time.replace(year=months // 12, month=months % 12 + 1)
+
+    def count(self, start: datetime.datetime, end: datetime.datetime) -> int:
+        """Returns the number of records from start to end, both included"""
+        if end < start:
+            return 0
+        if self is ArchiveType.hourly:
+            return int((end - start).total_seconds()) // 3600 + 1
+        if self is ArchiveType.daily:
+            return (end - start).days + 1
+        return (end.year - start.year) * 12 + end.month - start.month + 1
@@ -0,0 +1,132 @@
+"""Backfill of meter archives into Home Assistant long-term statistics"""
+from __future__ import annotations
+
+import asyncio
+import datetime
+import logging
+
+from homeassistant.components.recorder.models import StatisticData, StatisticMetaData
+from homeassistant.components.recorder.statistics import async_add_external_statistics
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import UnitOfVolume
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+import homeassistant.util.dt as dt_util
+
+from . import codec
+from .archive import MAX_ARCHIVE_RECORDS, ArchiveType
+from .const import (
+    DEFAULT_ARCHIVE_BACKFILL,
+    DOMAIN
+)
+from .pulsar_m_water import PulsarM
+from .pulsar_manager import PulsarManager
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_VERSION = 1
+# records imported between saves of the cursor, a week of hourly records
+ARCHIVE_CHUNK_RECORDS = 7 * 24
+
+
+def archive_store(hass: HomeAssistant, entry_id: str) -> Store:
+    """Store of the archive cursors of a config entry"""
+    return Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}.archive")
+
+
+class PulsarArchiveSync():
+    """Imports hourly archive records of every meter channel as external statistics
+
+    A cursor per channel keeps the meter time of the last imported record,
+    so each sync only downloads the records that were closed since.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry: ConfigEntry, device_manager: PulsarManager) -> None:
+        self._hass = hass
+        self._device_manager = device_manager
+        self._store = archive_store(hass, entry.entry_id)
+        self._cursors: dict[str, str] | None = None
+        self._lock = asyncio.Lock()
+
+    async def async_sync(self, now: datetime.datetime | None = None) -> None:
+        """Download and import new archive records of all meters"""
+        if self._lock.locked():
+            # previous sync is still downloading
+            return
+
+        async with self._lock:
+            if self._cursors is None:
+                self._cursors = await self._store.async_load() or {}
+
+            for dev_id, device in self._device_manager.get_devices(None).items():
+                if not isinstance(device, PulsarM) or not device.profile.archive:
+                    continue
+                for channel in range(1, device.channels + 1):
+                    try:
+                        await self._async_sync_channel(dev_id, device, channel)
+                    except Exception as ex:
+                        _LOGGER.error(
+                            f"Unable to read archive of {device.name} ch{channel}: {ex}")
+
+    async def _async_sync_channel(self, dev_id: str, device: PulsarM, channel: int) -> None:
+        archive_type = ArchiveType.hourly
+        cursor_key = f"{dev_id}.ch{channel}"
+
+        # Archives are kept in meter local time, which follows the HA time zone.
+        # The record of the period still open reads zero, stop at the one before.
+        end = archive_type.advance(
+            archive_type.floor(dt_util.now().replace(tzinfo=None)), -1)
+        cursor = self._cursors.get(cursor_key)
+        if cursor is not None:
+            start = archive_type.advance(
+                datetime.datetime.fromisoformat(cursor), 1)
+        else:
+            start = end - DEFAULT_ARCHIVE_BACKFILL
+
+        if start > end:
+            return
+
+        metadata = StatisticMetaData(
+            has_mean=False,
+            has_sum=True,
+            name=f"{device.name} water consumption ch{channel}",
+            source=DOMAIN,
+            statistic_id=f"{DOMAIN}:water_{device.addr}_ch{channel}",
+            unit_of_measurement=UnitOfVolume.LITERS,
+        )
+
+        # the first backfill spans a year, keep what was imported if it fails halfway
+        while start <= end:
+            chunk_end = min(end, archive_type.advance(start, ARCHIVE_CHUNK_RECORDS - 1))
+            frame_start = start
+            while frame_start <= chunk_end:
+                try:
+                    async for records in device.read_archive_range(
+                            channel, archive_type, frame_start, chunk_end):
+                        # A record covers the period starting at its time and holds the
+                        # counter at the end of it, as a statistics row does
+                        statistics = [
+                            StatisticData(
+                                start=dt_util.as_utc(time.replace(tzinfo=dt_util.DEFAULT_TIME_ZONE)),
+                                state=value,
+                                sum=value,
+                            )
+                            for time, value in records
+                        ]
+                        async_add_external_statistics(self._hass, metadata, statistics)
+                        frame_start = archive_type.advance(frame_start, len(records))
+                except codec.FrameError as ex:
+                    if ex.kind != "device_error":
+                        raise
+                    # The meter refuses these records, e.g. older than its archive
+                    # keeps. Asking again would fail the same way with every sync.
+                    frame_end = min(
+                        chunk_end, archive_type.advance(frame_start, MAX_ARCHIVE_RECORDS - 1))
+                    _LOGGER.warning(
+                        f"Skipping archive of {device.name} ch{channel} "
+                        f"from {frame_start} to {frame_end}: {ex}")
+                    frame_start = archive_type.advance(frame_end, 1)
+
+            self._cursors[cursor_key] = chunk_end.isoformat()
+            await self._store.async_save(self._cursors)
+            start = archive_type.advance(chunk_end, 1)
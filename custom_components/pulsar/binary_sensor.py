@@ -0,0 +1,136 @@
+"""Leak alarms of Pulsar water meters."""
+from __future__ import annotations
+
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from homeassistant.components.binary_sensor import (
+    BinarySensorDeviceClass,
+    BinarySensorEntity,
+    BinarySensorEntityDescription,
+)
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+
+from . import HomeAssistantPulsarData
+
+from .const import (
+    DATA_KEY_BURST_FLOW,
+    DATA_KEY_CONTINUOUS_FLOW,
+    DATA_KEY_QUIET_HOURS_FLOW,
+    DOMAIN,
+    PULSAR_DISCOVERY_NEW
+)
+
+from .coordinator import PulsarDataUpdateCoordinator
+from .leak import LeakDetector
+from .pulsar_m_water import PulsarM
+
+from .entity import BasePulsarEntity
+
+
+@dataclass
+class PulsarLeakBinarySensorEntityDescription(BinarySensorEntityDescription):
+    """Describes a leak check of a channel."""
+
+    value_fn: Callable[[LeakDetector], bool] = lambda detector: False
+
+
+def _leak_descriptions(ch: int) -> tuple[PulsarLeakBinarySensorEntityDescription, ...]:
+    suffix = "" if ch == 1 else f" ch{ch}"
+    return tuple(
+        PulsarLeakBinarySensorEntityDescription(
+            key=key.format(ch),
+            name=name + suffix,
+            translation_key=key.format(ch) if ch == 1 else None,
+            device_class=BinarySensorDeviceClass.PROBLEM,
+            has_entity_name=True,
+            value_fn=value_fn
+        )
+        for key, name, value_fn in (
+            (DATA_KEY_CONTINUOUS_FLOW, "Continuous flow",
+             lambda detector: detector.continuous_flow),
+            (DATA_KEY_QUIET_HOURS_FLOW, "Flow in quiet hours",
+             lambda detector: detector.quiet_hours_flow),
+            (DATA_KEY_BURST_FLOW, "Burst flow",
+             lambda detector: detector.burst),
+        )
+    )
+
+
+async def async_setup_entry(
+    hass: HomeAssistant, entry: ConfigEntry, async_add_entities: AddEntitiesCallback
+) -> None:
+    """Set up Pulsar leak alarms dynamically"""
+    hass_data: HomeAssistantPulsarData = hass.data[DOMAIN][entry.entry_id]
+
+    @callback
+    def async_discover_device(device_ids: list[int]) -> None:
+        """Discover and add the leak alarms of a discovered Pulsar meter."""
+        entities: list[BinarySensorEntity] = []
+        for device_id in device_ids:
+            device = hass_data.device_manager.get_device(device_id)
+            if not isinstance(device, PulsarM) or not device.profile.leak_detection:
+                continue
+            for spec in device.profile.channel_specs(device.channels):
+                for description in _leak_descriptions(spec.channel):
+                    entities.append(
+                        PulsarLeakBinarySensorEntity(
+                            hass_data.coordinator,
+                            device_id,
+                            device,
+                            description,
+                            spec.channel
+                        )
+                    )
+
+        async_add_entities(entities)
+
+    async_discover_device([*hass_data.device_manager._devices])
+
+    entry.async_on_unload(
+        async_dispatcher_connect(
+            hass, PULSAR_DISCOVERY_NEW, async_discover_device)
+    )
+
+
+class PulsarLeakBinarySensorEntity(BasePulsarEntity, BinarySensorEntity):
+    """Leak check of a channel.
+
+    Listens to the consumption reading of the channel and checks what the
+    meter keeps with every reading, so the alarm changes in the same cycle
+    as the counter and never looks at the recorder.
+    """
+
+    entity_description: PulsarLeakBinarySensorEntityDescription
+
+    def __init__(
+            self,
+            coordinator: PulsarDataUpdateCoordinator,
+            unique_id: str,
+            pulsar_device: PulsarM,
+            description: PulsarLeakBinarySensorEntityDescription,
+            channel: int) -> None:
+        super().__init__(coordinator, unique_id, pulsar_device, pulsar_device.channel_key(channel))
+
+        self.entity_description = description
+        self._detector = pulsar_device.leak_detector(channel)
+        internal_unique_id = (
+            f"{super().unique_id}.{description.key}"
+        )
+        self._attr_unique_id = internal_unique_id
+        self.entity_id = internal_unique_id
+
+    @property
+    def available(self) -> bool:
+        """Return if the meter answers and the channel was read since the start."""
+        return super().available and self.pulsar_device.health.is_available and \
+            self._detector is not None and self._detector.ready
+
+    @property
+    def is_on(self) -> bool | None:
+        if self._detector is None:
+            return None
+        return self.entity_description.value_fn(self._detector)
@@ -0,0 +1,88 @@
+"""Per-key cache of device readings"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+import datetime
+import enum
+from typing import Any
+
+
+class ReadingQuality(enum.Enum):
+    """Quality of a cached reading"""
+
+    # read during the current refresh interval of its key
+    good = "good"
+    # last refresh failed, the value is older than its refresh interval
+    stale = "stale"
+
+
+@dataclass(frozen=True)
+class KeyRefresh:
+    """How often a key is read and how long its last value stays usable"""
+
+    interval: datetime.timedelta
+    max_age: datetime.timedelta
+
+
+@dataclass(frozen=True)
+class CachedReading:
+    """Reading of a key with the time it was taken"""
+
+    value: Any
+    timestamp: datetime.datetime
+    quality: ReadingQuality = ReadingQuality.good
+    # restored from before a restart and not read since, kept whatever its
+    # age until the first read of its key
+    restored: bool = False
+
+
+class ReadingCache():
+    """Keeps the last reading of every key of a device
+
+    Only keys whose refresh interval has elapsed need to go to the bus, and
+    a reading is dropped once it is older than the max age of its key.
+    """
+
+    def __init__(self, refresh: dict[str, KeyRefresh], default_refresh: KeyRefresh) -> None:
+        self._refresh = refresh
+        self._default_refresh = default_refresh
+        self._readings: dict[str, CachedReading] = {}
+        self._next_refresh: dict[str, datetime.datetime] = {}
+
+    def refresh_of(self, key: str) -> KeyRefresh:
+        return self._refresh.get(key, self._default_refresh)
+
+    def expired_keys(self, keys: list[str], now: datetime.datetime) -> list[str]:
+        """Returns the keys that are due to be read from the device"""
+        next_refresh = self._next_refresh
+        return [key for key in keys if key not in next_refresh or next_refresh[key] <= now]
+
+    def update(self, key: str, value: Any, now: datetime.datetime) -> None:
+        """Stores a successful reading"""
+        self._readings[key] = CachedReading(value, now)
+        self._next_refresh[key] = now + self.refresh_of(key).interval
+
+    def restore(self, key: str, reading: CachedReading) -> None:
+        """Stores the last reading known before a restart, the key stays due to be read"""
+        if key not in self._readings:
+            self._readings[key] = CachedReading(
+                reading.value, reading.timestamp, reading.quality, True)
+
+    def mark_failed(self, key: str, now: datetime.datetime) -> None:
+        """Keeps the previous value of a key that could not be read as stale"""
+        reading = self._readings.get(key)
+        if reading is not None and (reading.quality is not ReadingQuality.stale or reading.restored):
+            self._readings[key] = CachedReading(
+                reading.value, reading.timestamp, ReadingQuality.stale)
+        # the key stays due, so it is retried on the next cycle
+        self._next_refresh.pop(key, None)
+
+    def get(self, key: str, now: datetime.datetime) -> CachedReading | None:
+        """Returns the reading of key, or None if there is none younger than its max age"""
+        reading = self._readings.get(key)
+        if reading is None:
+            return None
+        if not reading.restored and now - reading.timestamp > self.refresh_of(key).max_age:
+            del self._readings[key]
+            return None
+        return reading
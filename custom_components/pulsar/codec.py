@@ -0,0 +1,217 @@
+"""Encoding and decoding of Pulsar protocol frames
+
+Frame layout (both directions):
+
+    addr (4, BCD, big endian) | function (1) | length (1) | payload |
+    request id (2, little endian) | CRC16 ModBus (2, little endian)
+
+Hot paths are table driven and work on memoryviews, so a frame is
+allocated once when encoded and never copied when decoded.
+"""
+from __future__ import annotations
+
+import datetime
+import struct
+
+ADDR_SIZE = 4
+FUNC_SIZE = 1
+LEN_SIZE = 1
+ID_SIZE = 2
+CRC_SIZE = 2
+HEADER_SIZE = ADDR_SIZE + FUNC_SIZE + LEN_SIZE
+TRAILER_SIZE = ID_SIZE + CRC_SIZE
+SERVICE_SIZE = HEADER_SIZE + TRAILER_SIZE
+MAX_FRAME_SIZE = 0xFF
+MAX_PAYLOAD_SIZE = MAX_FRAME_SIZE - SERVICE_SIZE
+
+FUNC_OFFSET = ADDR_SIZE
+LEN_OFFSET = ADDR_SIZE + FUNC_SIZE
+
+# devices answer a request they cannot serve with function 0 and an error code
+FUNCTION_ERROR = 0x00
+
+
+def _make_crc16_table() -> tuple[int, ...]:
+    """CRC-16-ModBus (reflected 0x8005) lookup table"""
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            if crc & 0x0001:
+                crc = (crc >> 1) ^ 0xA001
+            else:
+                crc >>= 1
+        table.append(crc)
+    return tuple(table)
+
+
+CRC16_TABLE = _make_crc16_table()
+
+# 0..99 -> packed BCD byte and packed BCD byte -> 0..99
+BIN_TO_BCD = bytes(((i // 10) << 4) | (i % 10) for i in range(100))
+BCD_TO_BIN = tuple((b & 0x0F) + 10 * (b >> 4) for b in range(256))
+
+_ID_CRC = struct.Struct('<HH')
+_DATETIME = struct.Struct('6B')
+_UINT32_ARRAYS: dict[int, struct.Struct] = {}
+_FLOAT_STRUCTS = {
+    (2, False): struct.Struct('<e'),
+    (4, False): struct.Struct('<f'),
+    (8, False): struct.Struct('<d'),
+    (2, True): struct.Struct('>e'),
+    (4, True): struct.Struct('>f'),
+    (8, True): struct.Struct('>d'),
+}
+
+
+def crc16(buf, size: int, offset: int = 0) -> int:
+    """CRC-16-ModBus of size bytes of buf starting at offset"""
+    table = CRC16_TABLE
+    crc = 0xFFFF
+    for byte in memoryview(buf)[offset:offset + size]:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+    return crc
+
+
+def write_bcd(val: int, buf, size: int, offset: int, big_endian: bool):
+    """Writes val as size packed BCD bytes, the excess high digits are dropped"""
+    val = int(val)
+    for i in range(size):
+        val, digits = divmod(val, 100)
+        buf[size - i - 1 + offset if big_endian else i + offset] = BIN_TO_BCD[digits]
+    return buf
+
+
+def write_hex(val: int, buf, size: int, offset: int, big_endian: bool):
+    """Writes val as a size byte unsigned integer, the excess high bits are dropped"""
+    buf[offset:offset + size] = (val & ((1 << (size << 3)) - 1)).to_bytes(
+        size, 'big' if big_endian else 'little')
+    return buf
+
+
+def read_bcd(buf, size: int, offset: int, big_endian: bool) -> int:
+    res = 0
+    table = BCD_TO_BIN
+    view = memoryview(buf)[offset:offset + size]
+    for bcd_byte in (view if big_endian else reversed(view)):
+        res = res * 100 + table[bcd_byte]
+    return res
+
+
+def read_int_from_hex(buf, size: int, offset: int, big_endian: bool) -> int:
+    return int.from_bytes(
+        memoryview(buf)[offset:offset + size], 'big' if big_endian else 'little')
+
+
+def read_float_from_hex(buf, size: int, offset: int, big_endian: bool) -> float:
+    fmt = _FLOAT_STRUCTS.get((size, big_endian))
+    if fmt is None:
+        raise Exception("unreachable size")
+    return fmt.unpack_from(buf, offset)[0]
+
+
+def read_uint32_array(buf, count: int, offset: int) -> tuple[int, ...]:
+    """Decodes count little endian 32 bit values in one call"""
+    fmt = _UINT32_ARRAYS.get(count)
+    if fmt is None:
+        fmt = _UINT32_ARRAYS[count] = struct.Struct(f'<{count}I')
+    return fmt.unpack_from(buf, offset)
+
+
+def read_datetime(buf, offset: int) -> datetime.datetime:
+    """Decodes a 6 byte year-2000, month, day, hour, minute, second time"""
+    year, month, day, hour, minute, second = _DATETIME.unpack_from(buf, offset)
+    return datetime.datetime(2000 + year, month, day, hour, minute, second)
+
+
+def write_datetime(time: datetime.datetime, buf, offset: int):
+    _DATETIME.pack_into(buf, offset, time.year - 2000, time.month,
+                        time.day, time.hour, time.minute, time.second)
+    return buf
+
+
+def encode_frame(payload, function: int, addr: int, request_id: int) -> bytearray:
+    """Encodes a frame into a newly allocated buffer of the exact frame size"""
+    payload_size = len(payload)
+    if payload_size > MAX_PAYLOAD_SIZE:
+        raise Exception("payload is too long")
+
+    frame_size = payload_size + SERVICE_SIZE
+    buf = bytearray(frame_size)
+    write_bcd(addr, buf, ADDR_SIZE, 0, True)
+    buf[FUNC_OFFSET] = function
+    buf[LEN_OFFSET] = frame_size
+    buf[HEADER_SIZE:HEADER_SIZE + payload_size] = payload
+    id_offset = frame_size - TRAILER_SIZE
+    _ID_CRC.pack_into(buf, id_offset, request_id & 0xFFFF, 0)
+    crc = crc16(buf, frame_size - CRC_SIZE)
+    buf[frame_size - CRC_SIZE] = crc & 0xFF
+    buf[frame_size - 1] = crc >> 8
+    return buf
+
+
+def frame_addr(frame) -> int:
+    return read_bcd(frame, ADDR_SIZE, 0, True)
+
+
+def frame_request_id(frame) -> int:
+    return _ID_CRC.unpack_from(frame, len(frame) - TRAILER_SIZE)[0]
+
+
+def frame_payload(frame) -> memoryview:
+    """Returns the payload of a frame as a view into the frame"""
+    return memoryview(frame)[HEADER_SIZE:len(frame) - TRAILER_SIZE]
+
+
+def frame_crc_ok(frame) -> bool:
+    frame_size = len(frame)
+    frame_crc = read_int_from_hex(frame, CRC_SIZE, frame_size - CRC_SIZE, False)
+    return frame_crc == crc16(frame, frame_size - CRC_SIZE)
+
+
+class FrameError(Exception):
+    """Received frame that is not the expected reply
+
+    kind names the failed check: no_reply, truncated, device_error, length,
+    crc, address or request_id.
+    """
+
+    def __init__(self, kind: str, message: str) -> None:
+        super().__init__(message)
+        self.kind = kind
+
+
+def check_frame(frame, expected_size: int, addr: int, request_id: int) -> bool:
+    """Validates a received frame, raising FrameError on the first problem found"""
+    frame_size = len(frame)
+
+    if frame_size == 0:
+        raise FrameError("no_reply", "frame is too short")
+
+    if frame_size < SERVICE_SIZE:
+        raise FrameError("truncated", "frame is too short")
+
+    if frame[FUNC_OFFSET] == FUNCTION_ERROR and frame_size == frame[LEN_OFFSET] \
+            and frame_size > SERVICE_SIZE and frame_crc_ok(frame):
+        raise FrameError("device_error", f"device error {frame[HEADER_SIZE]}")
+
+    if frame_size != expected_size:
+        raise FrameError(
+            "truncated" if frame_size < expected_size else "length", "unexpected end of frame")
+
+    if expected_size != frame[LEN_OFFSET]:
+        raise FrameError("length", "unexpected frame length")
+
+    # check crc16
+    if not frame_crc_ok(frame):
+        raise FrameError("crc", "CRC mismatch")
+
+    # check address
+    if frame_addr(frame) != addr:
+        raise FrameError("address", "address mismatch")
+
+    # check request id
+    if frame_request_id(frame) != request_id:
+        raise FrameError("request_id", "request ID mismatch")
+
+    return True
@@ -1,6 +1,7 @@
 """Config flow for Pulsar."""
 from __future__ import annotations
 
+import asyncio
 import logging
 import uuid
 import datetime
@@ -16,16 +17,41 @@ from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import callback
 from homeassistant.data_entry_flow import FlowHandler, FlowResult
 
-from .connector import Connector
+from .discovery import async_scan_bus, parse_serial_ids
+from .registry import async_get_registry
 
 from .const import (
+    CONF_BURST_FLOW,
+    CONF_CHANNELS,
+    CONF_CONSUMPTION_DEADBAND,
+    CONF_CONTINUOUS_FLOW_HOURS,
     CONF_DEVICE_CONFIG,
     CONF_DEVICE_OR_ADDRESS,
+    CONF_FLOW_RATE_WINDOW,
+    CONF_FORCE_UPDATE_INTERVAL,
     CONF_MANUAL_PATH,
+    CONF_MIN_PUBLISH_INTERVAL,
     CONF_NAME,
+    CONF_QUIET_HOURS_END,
+    CONF_QUIET_HOURS_START,
+    CONF_QUIET_HOURS_VOLUME,
     CONF_SERIAL_ID,
+    CONF_SERIAL_IDS,
+    CONF_TEMPERATURE_DEADBAND,
     CONF_TYPE,
+    DEFAULT_CHANNELS,
+    DEFAULT_CONSUMPTION_DEADBAND,
+    DEFAULT_BURST_FLOW,
+    DEFAULT_CONTINUOUS_FLOW,
+    DEFAULT_FLOW_RATE_WINDOW,
+    DEFAULT_FORCE_UPDATE_INTERVAL,
+    DEFAULT_MIN_PUBLISH_INTERVAL,
+    DEFAULT_QUIET_HOURS_END,
+    DEFAULT_QUIET_HOURS_START,
+    DEFAULT_QUIET_HOURS_VOLUME,
+    DEFAULT_TEMPERATURE_DEADBAND,
     DOMAIN,
+    MAX_CHANNELS,
     STEP_ADD_MENU,
     STEP_CHANGE_PORT,
     STEP_CHOOSE_SERIAL_PORT,
@@ -33,9 +59,14 @@ from .const import (
     STEP_CONFIGURE_DEVICE,
     STEP_CONFIGURE_MENU,
     STEP_EDIT_DEVICE,
+    STEP_FLOW,
     STEP_MANUAL_PORT_CONFIG,
-    PulsarType
+    STEP_PUBLISHING,
+    STEP_SCAN_BUS,
+    STEP_SCAN_PROGRESS,
+    STEP_SCAN_RESULT
 )
+from .profiles import PROFILES, WATER_METER
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -43,7 +74,51 @@ DEVICE_CONFIG_SCHEMA_ENTRY = vol.Schema(
     {
         vol.Required(CONF_NAME): cv.string,
         vol.Required(CONF_SERIAL_ID): cv.positive_int,
-        vol.Required(CONF_TYPE): vol.In([e.value for e in PulsarType])
+        vol.Required(CONF_TYPE): vol.In(list(PROFILES)),
+        vol.Required(CONF_CHANNELS): vol.All(
+            vol.Coerce(int), vol.Range(min=1, max=MAX_CHANNELS))
+    }
+)
+
+SCAN_BUS_SCHEMA = vol.Schema(
+    {
+        vol.Required(CONF_SERIAL_IDS): cv.string
+    }
+)
+
+PUBLISHING_SCHEMA = vol.Schema(
+    {
+        # minutes, 0 writes unchanged states never
+        vol.Required(CONF_FORCE_UPDATE_INTERVAL): vol.All(
+            vol.Coerce(int), vol.Range(min=0, max=1440)),
+        vol.Required(CONF_TEMPERATURE_DEADBAND): vol.All(
+            vol.Coerce(float), vol.Range(min=0, max=10)),
+        vol.Required(CONF_CONSUMPTION_DEADBAND): vol.All(
+            vol.Coerce(float), vol.Range(min=0)),
+        # seconds
+        vol.Required(CONF_MIN_PUBLISH_INTERVAL): vol.All(
+            vol.Coerce(int), vol.Range(min=0, max=86400))
+    }
+)
+
+FLOW_SCHEMA = vol.Schema(
+    {
+        # minutes
+        vol.Required(CONF_FLOW_RATE_WINDOW): vol.All(
+            vol.Coerce(int), vol.Range(min=1, max=1440)),
+        vol.Required(CONF_CONTINUOUS_FLOW_HOURS): vol.All(
+            vol.Coerce(int), vol.Range(min=1, max=72)),
+        # local hours, the same start and end turn quiet hours off
+        vol.Required(CONF_QUIET_HOURS_START): vol.All(
+            vol.Coerce(int), vol.Range(min=0, max=23)),
+        vol.Required(CONF_QUIET_HOURS_END): vol.All(
+            vol.Coerce(int), vol.Range(min=0, max=23)),
+        # liters
+        vol.Required(CONF_QUIET_HOURS_VOLUME): vol.All(
+            vol.Coerce(float), vol.Range(min=0)),
+        # liters per minute
+        vol.Required(CONF_BURST_FLOW): vol.All(
+            vol.Coerce(float), vol.Range(min=0.1))
     }
 )
 
@@ -80,6 +155,19 @@ class BaseFlow(FlowHandler):
         self._device_data: dict[str, dict[str, Any]] = {}
         self.selected_device = None
         self.editing_device = False
+        self._scan_addresses: list[int] = []
+        self._scan_task: asyncio.Task | None = None
+        self._scan_result: dict[str, int] = {}
+
+    def _saved_options(self, changes: dict[str, Any] | None = None) -> dict[str, Any]:
+        """Options of the entry with changes applied, without the update trigger"""
+        options = {
+            key: value for key, value in self._config_entry.options.items()
+            if key != "CONF_UPD_DATE"
+        }
+        if changes:
+            options.update(changes)
+        return options
 
     async def _async_create_or_update_entry(self) -> FlowResult:
         """Create a config entry with the current flow state."""
@@ -105,9 +193,10 @@ class BaseFlow(FlowHandler):
                 data=data,
                 options=options)
 
+            # the options flow result replaces the options, keep the settings
             return self.async_create_entry(
                 title="",
-                data={}
+                data=self._saved_options()
             )
         else:
             return self.async_create_entry(
@@ -149,7 +238,7 @@ class BaseFlow(FlowHandler):
                 else ""
             )
 
-            return await self.async_step_configure_device()
+            return await self.async_step_add_menu()
 
         default_port = CONF_MANUAL_PATH
 
@@ -177,11 +266,15 @@ class BaseFlow(FlowHandler):
             self._title = device_or_address
             self._device_or_address = device_or_address
 
-            if Connector(device_or_address, "connector"):
-                if len(self._device_data) > 0:
-                    return await self.async_step_add_menu()
-                else:
-                    return await self.async_step_configure_device()
+            registry = async_get_registry(self.hass)
+            connection = await registry.async_acquire(device_or_address)
+            try:
+                connected = await connection.connector.async_ensure_connected()
+            finally:
+                await registry.async_release(connection)
+
+            if connected:
+                return await self.async_step_add_menu()
 
             errors["base"] = "cannot_connect"
 
@@ -216,7 +309,8 @@ class BaseFlow(FlowHandler):
             device_conf = {
                 CONF_NAME: user_input[CONF_NAME],
                 CONF_SERIAL_ID: user_input[CONF_SERIAL_ID],
-                CONF_TYPE: user_input[CONF_TYPE]
+                CONF_TYPE: user_input[CONF_TYPE],
+                CONF_CHANNELS: user_input[CONF_CHANNELS]
             }
 
             if self.editing_device:
@@ -273,12 +367,13 @@ class BaseFlow(FlowHandler):
         if user_input is None:
             user_input = {}
 
-        types = [e.value for e in PulsarType]
+        types = list(PROFILES)
 
         base_defaults = {}
         base_defaults[CONF_NAME] = ""
         base_defaults[CONF_SERIAL_ID] = ""
         base_defaults[CONF_TYPE] = types[0]
+        base_defaults[CONF_CHANNELS] = DEFAULT_CHANNELS
 
         defaults = {}
 
@@ -290,7 +385,8 @@ class BaseFlow(FlowHandler):
 
             # If selected device exists as a config entry, load config from it
             if (edit_dev_conf_id is not None):
-                defaults = self._device_data[edit_dev_conf_id].copy()
+                defaults = {
+                    **base_defaults, **self._device_data[edit_dev_conf_id]}
             else:
                 defaults = base_defaults
             placeholders = {"for_device": f" for device `{dev_name}`"}
@@ -307,6 +403,114 @@ class BaseFlow(FlowHandler):
             description_placeholders=placeholders
         )
 
+    async def async_step_scan_bus(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Enter serial numbers to look for on the bus."""
+        errors = {}
+
+        if user_input is not None:
+            try:
+                self._scan_addresses = parse_serial_ids(user_input[CONF_SERIAL_IDS])
+            except ValueError:
+                errors["base"] = "invalid_serial_ids"
+            else:
+                return await self.async_step_scan_progress()
+
+        return self.async_show_form(
+            step_id=STEP_SCAN_BUS,
+            data_schema=SCAN_BUS_SCHEMA,
+            errors=errors
+        )
+
+    async def async_step_scan_progress(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Probe the serial numbers, the scan stops when the flow is closed."""
+        if self._scan_task is None:
+            self._scan_task = self.hass.async_create_task(
+                self._async_scan(self._device_or_address, self._scan_addresses))
+
+        if not self._scan_task.done():
+            return self.async_show_progress(
+                step_id=STEP_SCAN_PROGRESS,
+                progress_action="scan_bus",
+                description_placeholders={
+                    "count": str(len(self._scan_addresses)),
+                    "port": self._device_or_address
+                },
+                progress_task=self._scan_task
+            )
+
+        scan_task = self._scan_task
+        self._scan_task = None
+        try:
+            found = scan_task.result()
+        except Exception as ex:
+            _LOGGER.error(f"Scan of {self._device_or_address} failed: {ex}")
+            self._scan_result = {}
+        else:
+            self._scan_result = {
+                "found": len(found),
+                "added": self._add_found_devices(found)
+            }
+
+        return self.async_show_progress_done(next_step_id=STEP_SCAN_RESULT)
+
+    async def async_step_scan_result(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Show what the scan found."""
+        if user_input is not None:
+            return await self.async_step_add_menu()
+
+        errors = {}
+        if not self._scan_result:
+            errors["base"] = "cannot_connect"
+
+        return self.async_show_form(
+            step_id=STEP_SCAN_RESULT,
+            data_schema=vol.Schema({}),
+            errors=errors,
+            description_placeholders={
+                "found": str(self._scan_result.get("found", 0)),
+                "added": str(self._scan_result.get("added", 0))
+            }
+        )
+
+    async def _async_scan(self, device_or_address: str, addresses: list[int]) -> list[int]:
+        registry = async_get_registry(self.hass)
+        connection = await registry.async_acquire(device_or_address)
+        step = max(len(addresses) // 10, 1)
+
+        def _progress(done: int, total: int) -> None:
+            if done % step == 0 or done == total:
+                _LOGGER.info(
+                    f"Scan of {device_or_address}: {done} of {total} serial numbers probed")
+
+        try:
+            return await async_scan_bus(connection.bus, addresses, _progress)
+        finally:
+            await registry.async_release(connection)
+
+    def _add_found_devices(self, found: list[int]) -> int:
+        """Adds the meters that are not configured yet, returns how many were added"""
+        serial_ids = {conf[CONF_SERIAL_ID] for conf in self._device_data.values()}
+        names = {conf[CONF_NAME] for conf in self._device_data.values()}
+        added = 0
+        for serial_id in found:
+            name = f"Pulsar {serial_id}"
+            if serial_id in serial_ids or name in names:
+                continue
+            self._device_data[uuid.uuid4().hex] = {
+                CONF_NAME: name,
+                CONF_SERIAL_ID: serial_id,
+                CONF_TYPE: WATER_METER.type,
+                CONF_CHANNELS: DEFAULT_CHANNELS
+            }
+            added += 1
+        return added
+
     async def async_step_complete(
         self, user_input: dict[str, Any] | None = None
     ) -> FlowResult:
@@ -318,7 +522,9 @@ class BaseFlow(FlowHandler):
         self, user_input: dict[str, Any] | None = None
     ) -> FlowResult:
         """Add device."""
-        options = [STEP_CONFIGURE_DEVICE, STEP_COMPLETE]
+        options = [STEP_CONFIGURE_DEVICE, STEP_SCAN_BUS]
+        if len(self._device_data) > 0:
+            options.append(STEP_COMPLETE)
 
         return self.async_show_menu(
             step_id=STEP_ADD_MENU,
@@ -369,14 +575,58 @@ class OptionsFlowHandler(BaseFlow, config_entries.OptionsFlow):
     async def async_step_configure_menu(
         self, user_input: dict[str, Any] | None = None
     ) -> FlowResult:
-        options = [STEP_CONFIGURE_DEVICE, STEP_EDIT_DEVICE,
-                   STEP_CHANGE_PORT]
+        options = [STEP_CONFIGURE_DEVICE, STEP_SCAN_BUS, STEP_EDIT_DEVICE,
+                   STEP_CHANGE_PORT, STEP_PUBLISHING, STEP_FLOW]
 
         return self.async_show_menu(
             step_id=STEP_CONFIGURE_MENU,
             menu_options=options
         )
 
+    async def async_step_publishing(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Handle how sensor states are written"""
+        if user_input is not None:
+            return self.async_create_entry(
+                title="",
+                data=self._saved_options(user_input))
+
+        defaults = {
+            CONF_FORCE_UPDATE_INTERVAL: DEFAULT_FORCE_UPDATE_INTERVAL.total_seconds() / 60,
+            CONF_TEMPERATURE_DEADBAND: DEFAULT_TEMPERATURE_DEADBAND,
+            CONF_CONSUMPTION_DEADBAND: DEFAULT_CONSUMPTION_DEADBAND,
+            CONF_MIN_PUBLISH_INTERVAL: DEFAULT_MIN_PUBLISH_INTERVAL,
+            **self._config_entry.options,
+        }
+        return self.async_show_form(
+            step_id=STEP_PUBLISHING,
+            data_schema=schema_defaults(PUBLISHING_SCHEMA, **defaults)
+        )
+
+    async def async_step_flow(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Handle how flow rates and leaks are derived from the readings"""
+        if user_input is not None:
+            return self.async_create_entry(
+                title="",
+                data=self._saved_options(user_input))
+
+        defaults = {
+            CONF_FLOW_RATE_WINDOW: DEFAULT_FLOW_RATE_WINDOW.total_seconds() / 60,
+            CONF_CONTINUOUS_FLOW_HOURS: DEFAULT_CONTINUOUS_FLOW.total_seconds() / 3600,
+            CONF_QUIET_HOURS_START: DEFAULT_QUIET_HOURS_START,
+            CONF_QUIET_HOURS_END: DEFAULT_QUIET_HOURS_END,
+            CONF_QUIET_HOURS_VOLUME: DEFAULT_QUIET_HOURS_VOLUME,
+            CONF_BURST_FLOW: DEFAULT_BURST_FLOW,
+            **self._config_entry.options,
+        }
+        return self.async_show_form(
+            step_id=STEP_FLOW,
+            data_schema=schema_defaults(FLOW_SCHEMA, **defaults)
+        )
+
     async def async_step_change_port(self, user_input=None) -> FlowResult:
         """Handle change port"""
         return await self.async_step_choose_serial_port()
@@ -1,130 +1,249 @@
 """For communicate with devices with serial connection"""
 from __future__ import annotations
 
+import asyncio
+import contextlib
+import functools
 import logging
+import os
+
 import serial
-import time
+import serial_asyncio
+
+from . import codec
+from .metrics import BusMetrics
+from .tcp_session import TcpSession
+from .timeouts import AdaptiveTimeouts
 
 
 DEFAULT_BAUDRATE = 9600
 DEFAULT_BYTESIZE = serial.EIGHTBITS
 DEFAULT_PARITY = serial.PARITY_NONE
 DEFAULT_STOPBITS = serial.STOPBITS_ONE
+# reply timeout until round trips of the bus have been observed
+DEFAULT_TIMEOUT = 3
+# silence that ends a frame once it has started, generous enough for TCP gateways
+DEFAULT_INTER_BYTE_TIMEOUT = 0.1
+# how long a request without deadline waits for a gateway to reconnect
+MAX_RECONNECT_WAIT = 30
 
 logging.basicConfig(level=logging.ERROR)
 _LOGGER = logging.getLogger(__name__)
 
 
-class Connector(object):
-    """Represent connector"""
+def is_serial_device(device_or_ipaddress: str) -> bool:
+    """Return True if the address is a local serial device, not a TCP gateway"""
+    return device_or_ipaddress.startswith("/") or device_or_ipaddress.startswith("C")
+
+
+def normalize_address(device_or_ipaddress: str) -> str:
+    """Returns the same key for every spelling of a port or gateway address"""
+    address = device_or_ipaddress.strip()
+    if address.startswith("socket://"):
+        address = address[len("socket://"):]
+    if is_serial_device(address):
+        if address.startswith("/"):
+            # resolves /dev/serial/by-id/... links to the tty they point at
+            return os.path.realpath(address)
+        return address.upper()
+    host, _, port = address.rpartition(":")
+    try:
+        return f"{host.lower()}:{int(port)}"
+    except ValueError:
+        return address.lower()
+
+
+class AsyncConnector(object):
+    """Represent connector
 
-    def __init__(self, device_or_ipaddress, name: str):
+    Requests are serialized on an asyncio.Lock, which wakes waiters in FIFO
+    order, so callers queue for the bus without sleeping or holding a thread.
+    """
+
+    def __init__(self, device_or_ipaddress: str, name: str):
         # device_or_ipaddress in the form
         #  127.0.0.1:1024
         # or
         #  /dev/ttyUSB0
         self._device_or_ipaddress = device_or_ipaddress
         self._name = name
-        self._serport = None
-        self._init_serial()
-        self._busy = False
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._session: TcpSession | None = None
+        self._metrics = BusMetrics()
+        if not is_serial_device(device_or_ipaddress):
+            host, _, port = normalize_address(device_or_ipaddress).rpartition(":")
+            self._session = TcpSession(host, port, self._metrics.record_connect)
+        self._lock = asyncio.Lock()
+        self._timeouts = AdaptiveTimeouts(DEFAULT_TIMEOUT)
+
+    @property
+    def timeouts(self) -> AdaptiveTimeouts:
+        return self._timeouts
+
+    @property
+    def metrics(self) -> BusMetrics:
+        return self._metrics
+
+    @property
+    def device_or_address(self) -> str:
+        return self._device_or_ipaddress
+
+    @property
+    def is_connected(self) -> bool:
+        if self._session is not None:
+            return self._session.is_connected
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def async_ensure_connected(self) -> bool:
+        """Opens the port unless it is already open, without disturbing a transaction"""
+        async with self._lock:
+            if self.is_connected:
+                return True
+            return await self.async_connect()
 
-    def _init_serial(self):
+    async def async_connect(self) -> bool:
         """
-        Initialises the serial port (or tcp connection) and tries to open it
+        Opens the serial port (or tcp connection)
         Returns True if successful
         """
+        if self._session is not None:
+            # assume serial over IP via socket
+            if await self._session.async_open():
+                _LOGGER.info(f"Serial device {self._device_or_ipaddress} opened")
+                return True
+            _LOGGER.error(
+                f"Unable to initialise serial port on {self._device_or_ipaddress}")
+            return False
+
+        self._drop()
+
         try:
-            if self._serport is not None and self._serport.is_open:
-                self._serport.close()
-                self._serport = None
+            # assume direct serial
+            self._reader, self._writer = await self._async_open_serial()
 
-            if self._device_or_ipaddress.startswith("/") or self._device_or_ipaddress.startswith("C"):
-                # assume direct serial
-                self._serport = serial.Serial(self._device_or_ipaddress)
-            else:
-                # assume serial over IP via socket
-                self._serport = serial.serial_for_url(
-                    f"socket://{self._device_or_ipaddress}")
-            # Ensures that the serial port has not
-            # been left hanging around by a previous process.
-
-            if self._serport.is_open:
-                self._serport.close()
-            self._serport.baudrate = DEFAULT_BAUDRATE
-            self._serport.bytesize = DEFAULT_BYTESIZE
-            self._serport.parity = DEFAULT_PARITY
-            self._serport.stopbits = DEFAULT_STOPBITS
-            self._serport.timeout = 3
-            self._serport.open()
+            self._metrics.record_connect()
             _LOGGER.info(f"Serial device {self._device_or_ipaddress} opened")
             return True
 
-        except serial.SerialException as se:
+        except (serial.SerialException, OSError, ValueError) as se:
             _LOGGER.error(
                 f"Unable to initialise serial port on {self._device_or_ipaddress}, error {se}")
-            self._serport = None
+            self._reader = None
+            self._writer = None
             return False
 
-    def send(self, message: bytes, response_size: int):
+    async def _async_open_serial(self) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        """Opens the serial port in the executor, opening a tty may block on its driver"""
+        loop = asyncio.get_running_loop()
+        serial_instance = await loop.run_in_executor(None, functools.partial(
+            serial.serial_for_url,
+            self._device_or_ipaddress,
+            baudrate=DEFAULT_BAUDRATE,
+            bytesize=DEFAULT_BYTESIZE,
+            parity=DEFAULT_PARITY,
+            stopbits=DEFAULT_STOPBITS))
+        reader = asyncio.StreamReader()
+        protocol = asyncio.StreamReaderProtocol(reader)
+        try:
+            transport, _ = await serial_asyncio.connection_for_serial(
+                loop, lambda: protocol, serial_instance)
+        except BaseException:
+            serial_instance.close()
+            raise
+        return reader, asyncio.StreamWriter(transport, protocol, reader, loop)
+
+    async def async_start(self) -> bool:
+        """Gets the port ready without waiting on the bus
+
+        A local serial port is opened right away, which fails fast when the
+        adapter is missing. A gateway is connected in the background and
+        requests wait for it, so a slow or unreachable gateway holds nobody up.
+        Returns False if the port cannot be used.
+        """
+        if self._session is not None:
+            self._session.start_reconnect()
+            return True
+        return await self.async_ensure_connected()
+
+    async def _async_wait_connected(self, deadline: float | None) -> bool:
+        """Opens a serial port inline, a gateway is waited for until deadline"""
+        if self.is_connected:
+            return True
+        if self._session is None:
+            return await self.async_connect()
+        if deadline is None:
+            timeout = MAX_RECONNECT_WAIT
+        else:
+            timeout = deadline - asyncio.get_running_loop().time()
+        return await self._session.async_wait_connected(timeout)
+
+    def _streams(self) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        if self._session is not None:
+            return self._session.reader, self._session.writer
+        return self._reader, self._writer
+
+    async def send(
+            self,
+            message: bytes,
+            deadline: float | None = None,
+            reply_timeout: float | None = None) -> bytearray:
         """
-        Sends a message to the device
-        Attempts to reopen the serial port if it is not open
-        If there are any errors or no reply an empty list is returned
-        Returns the response as a List, empty list if no response or False if error
+        Sends a message to the device and waits for the reply frame
+        Attempts to reopen the serial port if it is not open, or waits
+        until deadline (event loop time) for a gateway to reconnect
+        reply_timeout caps the reply timeout learned for the device
+        Returns the response, truncated (or empty) if the device
+        did not answer in time
         """
+        addr = codec.frame_addr(message)
 
-        if self._serport is None:
-            if not self._init_serial():
+        async with self._lock:
+            if not await self._async_wait_connected(deadline):
                 raise Exception("port cannot init")
 
-        if self._serport is not None:
-            # port successfully opened
-            if self._serport.is_open:
-                # All should be good to communicate via the serial port
-                try:
-                    sleep_count = 0
-                    while self._busy:
-                        _LOGGER.debug(f"Sleeping {sleep_count}...")
-                        time.sleep(0.5)
-                        sleep_count += 1
-                    _LOGGER.debug(f"Sending {message}")
-                    serial_message = bytes(message)
-                    self._busy = True
-                    self._serport.write(serial_message)  # Write a string
-
-                except serial.SerialTimeoutException:
-                    _LOGGER.error(
-                        f"Timeout writing to {self._device_or_ipaddress}")
-                    self._busy = False
-                    return datalist
-
-                except serial.SerialException as se:
-                    _LOGGER.error(
-                        f"Error writing to {self._device_or_ipaddress}: {se}")
-                    self._serport.close()
-                    self._serport = None
-                    self._busy = False
-                    return datalist
-
-                # write went well so
-                # now wait for reply
-                try:
+            reader, writer = self._streams()
+            started = asyncio.get_running_loop().time()
+            try:
+                discarded = await self._discard_input(reader)
+                if discarded:
                     _LOGGER.debug(
-                        f"Reading serial port {self._device_or_ipaddress}")
-                    byteread = self._serport.read(response_size)
-                    datalist = byteread
-
-                except serial.SerialException as se:
-                    _LOGGER.error(
-                        f"Unable to read serial port {self._device_or_ipaddress}: {se}")
-                    self._serport.close()
-                    self._serport = None
-                self._busy = False
-            else:
+                        f"Discarded {len(discarded)} stale bytes from {self._device_or_ipaddress}")
+                _LOGGER.debug(f"Sending {message}")
+                writer.write(message)
+                await writer.drain()
+            except (serial.SerialException, OSError) as se:
+                _LOGGER.error(
+                    f"Error writing to {self._device_or_ipaddress}: {se}")
+                self._drop()
+                return bytearray()
+
+            # write went well so
+            # now wait for reply
+            timeout = self._timeouts.timeout(addr)
+            if reply_timeout is not None:
+                timeout = min(timeout, reply_timeout)
+            try:
                 _LOGGER.debug(
-                    f"Serial port {self._device_or_ipaddress} has been created but is not open, resetting...")
-                self._serport = None
+                    f"Reading serial port {self._device_or_ipaddress}")
+                datalist, rtt, received, stale, foreign = await self._read_reply(
+                    reader, message, timeout)
+            except (serial.SerialException, OSError) as se:
+                _LOGGER.error(
+                    f"Unable to read serial port {self._device_or_ipaddress}: {se}")
+                self._drop()
+                return bytearray()
+            busy = asyncio.get_running_loop().time() - started
+
+        self._metrics.record_transaction(
+            addr, len(message), len(discarded) + received, rtt, busy, stale,
+            foreign, probe=reply_timeout is not None)
+        if rtt is None:
+            if reply_timeout is None:
+                # a capped wait says nothing about how slow the device is
+                self._timeouts.record_timeout(addr)
+        else:
+            self._timeouts.record(addr, rtt)
 
         if len(datalist) < 1:
             _LOGGER.debug(f"No response from {self._device_or_ipaddress}")
@@ -133,17 +252,161 @@ class Connector(object):
                 f"Received from {self._device_or_ipaddress}: {datalist}")
         return datalist
 
+    async def _read_reply(
+            self,
+            reader: asyncio.StreamReader,
+            request: bytes,
+            timeout: float) -> tuple[bytearray, float | None, int, int, int]:
+        """Reads the reply to request, skipping whatever else is on the line
+
+        The reader looks for the header of the addressed device and takes
+        the frame size from its length byte. Frames with the address but
+        another request ID are late replies to earlier requests and are
+        dropped, as are complete frames of other addresses. Other bytes
+        before a header are noise. A frame that fails its CRC
+        is skipped one byte at a time, so a real header inside it is found.
+
+        timeout bounds the wait for the reply. Once a frame has started (or
+        a frame with a bad CRC arrived) the wait ends at the first gap longer
+        than the inter-byte timeout, and the truncated or corrupt frame is
+        returned as is for check_frame to report.
+        Returns the frame, the time until it started to arrive, the number
+        of bytes received, the number of stale replies dropped and the
+        number of frames of other addresses dropped.
+        """
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        deadline = start + timeout
+        header = request[:codec.ADDR_SIZE]
+        request_id = codec.frame_request_id(request)
+        buf = bytearray()
+        arrived = None
+        rtt = None
+        received = 0
+        stale = 0
+        foreign = 0
+        corrupt: bytearray | None = None
+        corrupt_rtt = None
+        while True:
+            foreign += self._drop_foreign_frames(buf, header)
+            pos = buf.find(header)
+            if pos < 0:
+                # keep what may be the start of a header
+                del buf[:max(len(buf) - codec.ADDR_SIZE + 1, 0)]
+            else:
+                del buf[:pos]
+                if rtt is None:
+                    rtt = arrived
+                if len(buf) >= codec.HEADER_SIZE:
+                    size = buf[codec.LEN_OFFSET]
+                    frame = buf[:size]
+                    if size < codec.SERVICE_SIZE:
+                        pass
+                    elif len(buf) < size:
+                        frame = None
+                    elif not codec.frame_crc_ok(frame):
+                        corrupt, corrupt_rtt = frame, rtt
+                    elif codec.frame_request_id(frame) == request_id:
+                        return frame, rtt, received, stale, foreign
+                    else:
+                        _LOGGER.debug(f"Dropped late reply {frame}")
+                        stale += 1
+                        del buf[:size - 1]
+                    if frame is not None:
+                        # resync on the next header
+                        del buf[0]
+                        rtt = None
+                        continue
+
+            if len(buf) >= codec.ADDR_SIZE or corrupt is not None:
+                wait = DEFAULT_INTER_BYTE_TIMEOUT
+            else:
+                wait = deadline - loop.time()
+                if wait <= 0:
+                    break
+            try:
+                chunk = await asyncio.wait_for(reader.read(codec.MAX_FRAME_SIZE), wait)
+            except asyncio.TimeoutError:
+                break
+            if not chunk:
+                raise ConnectionResetError("connection closed by peer")
+            arrived = loop.time() - start
+            received += len(chunk)
+            buf += chunk
+
+        if len(buf) >= codec.ADDR_SIZE:
+            return buf, rtt, received, stale, foreign
+        if corrupt is not None:
+            return corrupt, corrupt_rtt, received, stale, foreign
+        return bytearray(), None, received, stale, foreign
+
+    @staticmethod
+    def _drop_foreign_frames(buf: bytearray, header: bytes) -> int:
+        """Drops complete frames of other addresses before the first header, returns how many"""
+        dropped = 0
+        pos = 0
+        while pos + codec.HEADER_SIZE <= len(buf) and buf[pos:pos + codec.ADDR_SIZE] != header:
+            size = buf[pos + codec.LEN_OFFSET]
+            if codec.SERVICE_SIZE <= size <= len(buf) - pos \
+                    and codec.frame_crc_ok(buf[pos:pos + size]):
+                _LOGGER.debug(f"Dropped frame of another address {buf[pos:pos + size]}")
+                del buf[pos:pos + size]
+                dropped += 1
+            else:
+                pos += 1
+        return dropped
+
+    @staticmethod
+    async def _discard_input(reader: asyncio.StreamReader) -> bytes:
+        """Takes the bytes received since the last transaction without waiting
+
+        Late replies to requests that timed out would otherwise be read as
+        the reply to the next request.
+        """
+        discarded = bytearray()
+        while True:
+            read = asyncio.ensure_future(reader.read(codec.MAX_FRAME_SIZE))
+            # a read of buffered bytes completes in its first step, one pass
+            # of the event loop tells whether anything is waiting
+            await asyncio.sleep(0)
+            if not read.done():
+                read.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await read
+                return bytes(discarded)
+            chunk = read.result()
+            if not chunk:
+                return bytes(discarded)
+            discarded += chunk
+
     def name(self) -> str:
         """Returns the name of serial device"""
         return self._name
 
+    def _drop(self):
+        """Closes a broken connection, a gateway session reconnects in the background"""
+        if self._session is not None:
+            self._session.drop()
+            return
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = None
+        self._writer = None
+
     def disconnect(self):
         """disconnects from the serial port or tcp connection"""
-        if self._serport is not None and self._serport.is_open:
-            self._serport.close()
-            self._serport = None
-            _LOGGER.info(f"Closed serial port {self._device_or_ipaddress}")
+        if self._session is not None:
+            self._session.close()
+        elif self._writer is not None:
+            self._writer.close()
+        self._reader = None
+        self._writer = None
+        _LOGGER.info(f"Closed serial port {self._device_or_ipaddress}")
 
     def __del__(self):
         """Destructor"""
-        self.disconnect()
+        try:
+            self.disconnect()
+        except RuntimeError:
+            # event loop is already closed
+            pass
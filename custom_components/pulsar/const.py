@@ -10,40 +10,107 @@ DOMAIN = "pulsar"
 DATA_PULSAR = "pulsar"
 DATA_PULSAR_CONFIG = "pulsar_device_config"
 DATA_PULSAR_MANAGER = "pulsar_manager"
+DATA_PULSAR_REGISTRY = "pulsar_registry"
 
 CONF_ACTION = "action"
+CONF_BURST_FLOW = "burst_flow"
 CONF_ENTITIES = "entities"
+CONF_CHANNELS = "channels"
+CONF_CONSUMPTION_DEADBAND = "consumption_deadband"
+CONF_CONTINUOUS_FLOW_HOURS = "continuous_flow_hours"
 CONF_CONNECTOR = "connector"
 CONF_DEVICE_CONFIG = "device_config"
 CONF_DEVICE = "device"
 CONF_DEVICE_OR_ADDRESS = "device_or_address"
+CONF_FLOW_RATE_WINDOW = "flow_rate_window"
+CONF_FORCE_UPDATE_INTERVAL = "force_update_interval"
 CONF_ID = "id"
 CONF_MANUAL_PATH = "Enter Manually"
+CONF_MIN_PUBLISH_INTERVAL = "min_publish_interval"
 CONF_NAME = "name"
+CONF_QUIET_HOURS_END = "quiet_hours_end"
+CONF_QUIET_HOURS_START = "quiet_hours_start"
+CONF_QUIET_HOURS_VOLUME = "quiet_hours_volume"
 CONF_SERIAL_ID = "serial_id"
+CONF_SERIAL_IDS = "serial_ids"
+CONF_TEMPERATURE_DEADBAND = "temperature_deadband"
 CONF_TYPE = "type"
 
 STEP_ADD_MENU = "add_menu"
 STEP_EDIT_DEVICE = "edit_device"
+STEP_FLOW = "flow"
 STEP_CHANGE_PORT = "change_port"
 STEP_COMPLETE = "complete"
 STEP_CONFIGURE_DEVICE = "configure_device"
 STEP_CONFIGURE_MENU = "configure_menu"
 STEP_CHOOSE_SERIAL_PORT = "choose_serial_port"
 STEP_MANUAL_PORT_CONFIG = "manual_port_config"
+STEP_PUBLISHING = "publishing"
+STEP_SCAN_BUS = "scan_bus"
+STEP_SCAN_PROGRESS = "scan_progress"
+STEP_SCAN_RESULT = "scan_result"
 
 PULSAR_DISCOVERY_NEW = "pulsar_discovery_new"
 
 DEFAULT_SCAN_INTERVAL = timedelta(seconds=60)
+DEFAULT_CHANNELS = 1
+# unchanged sensor states are not written again, unless this is set
+DEFAULT_FORCE_UPDATE_INTERVAL = timedelta(0)
+# changes smaller than these are not published, in the unit of the sensor
+DEFAULT_TEMPERATURE_DEADBAND = 0.1
+DEFAULT_CONSUMPTION_DEADBAND = 0.0
+# seconds a sensor waits after publishing before it publishes again
+DEFAULT_MIN_PUBLISH_INTERVAL = 0
+# flow rates are averaged over this long
+DEFAULT_FLOW_RATE_WINDOW = timedelta(minutes=15)
+# leak checks: flow without a pause for this long, more than this many
+# liters used between these local hours, flow of at least this many L/min
+DEFAULT_CONTINUOUS_FLOW = timedelta(hours=3)
+DEFAULT_QUIET_HOURS_START = 2
+DEFAULT_QUIET_HOURS_END = 5
+DEFAULT_QUIET_HOURS_VOLUME = 1.0
+DEFAULT_BURST_FLOW = 30.0
+DEFAULT_ARCHIVE_SYNC_INTERVAL = timedelta(hours=1)
+DEFAULT_ARCHIVE_BACKFILL = timedelta(days=365)
 
-DATA_KEY_CURRENT_WATER_CONSUMPTION_CH1 = "current_water_consumption_ch1"
+# Channels are addressed by a 32 bit mask in read requests
+MAX_CHANNELS = 32
+
+DATA_KEY_CURRENT_WATER_CONSUMPTION = "current_water_consumption_ch{}"
+DATA_KEY_CURRENT_WATER_CONSUMPTION_CH1 = DATA_KEY_CURRENT_WATER_CONSUMPTION.format(1)
 DATA_KEY_SYSTEM_TIME = "system_time"
 DATA_KEY_DEVICE_TEMPERATURE = "device_temperature"
 DATA_KEY_BATTERY_VOLTAGE = "battery_voltage"
+DATA_KEY_DIAGNOSTIC_FLAGS = "diagnostic_flags"
+DATA_KEY_DAYLIGHT_SAVING_TIME = "daylight_saving_time"
+DATA_KEY_SUPPLY_TEMPERATURE = "supply_temperature"
+DATA_KEY_RETURN_TEMPERATURE = "return_temperature"
+DATA_KEY_TEMPERATURE_DIFFERENCE = "temperature_difference"
+DATA_KEY_HEAT_POWER = "heat_power"
+DATA_KEY_HEAT_ENERGY = "heat_energy"
+DATA_KEY_HEAT_VOLUME = "heat_volume"
+DATA_KEY_HEAT_FLOW = "heat_flow"
+DATA_KEY_PULSE_COUNTER = "pulse_counter_ch{}"
+# derived from consumption readings, never read from the meter
+DATA_KEY_FLOW_RATE = "flow_rate_ch{}"
+DATA_KEY_CONTINUOUS_FLOW = "continuous_flow_ch{}"
+DATA_KEY_QUIET_HOURS_FLOW = "quiet_hours_flow_ch{}"
+DATA_KEY_BURST_FLOW = "burst_flow_ch{}"
+
+# (refresh interval, max age) of readings, keys not listed here are read
+# every scan and stay usable for DEFAULT_MAX_AGE
+DEFAULT_MAX_AGE = DEFAULT_SCAN_INTERVAL * 5
+KEY_REFRESH = {
+    DATA_KEY_SYSTEM_TIME: (timedelta(hours=1), timedelta(hours=3)),
+    DATA_KEY_DEVICE_TEMPERATURE: (timedelta(minutes=15), timedelta(hours=1)),
+    DATA_KEY_BATTERY_VOLTAGE: (timedelta(hours=6), timedelta(days=1)),
+    DATA_KEY_DIAGNOSTIC_FLAGS: (timedelta(minutes=15), timedelta(hours=1)),
+    DATA_KEY_DAYLIGHT_SAVING_TIME: (timedelta(days=1), timedelta(days=3)),
+}
 
 PLATFORMS = [
     # Platform.ALARM_CONTROL_PANEL,
-    # Platform.BINARY_SENSOR,
+    Platform.BINARY_SENSOR,
     # Platform.BUTTON,
     # Platform.CAMERA,
     # Platform.CLIMATE,
@@ -0,0 +1,163 @@
+"""Coordinator for polling Pulsar devices on a shared bus"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+import homeassistant.util.dt as dt_util
+
+from .cache import CachedReading
+from .health import DeviceUnavailable
+
+from .const import (
+    DEFAULT_SCAN_INTERVAL,
+    DOMAIN
+)
+
+from .pulsar_manager import PulsarManager
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class PulsarDataUpdateCoordinator(DataUpdateCoordinator[dict[str, dict[str, CachedReading | None]]]):
+    """Polls every device of a manager in one cycle and caches the readings.
+
+    Entities register with a (device id, data key) context, so a cycle only
+    reads the keys that have an entity listening for them, and of those only
+    the keys whose refresh interval has elapsed in the device reading cache.
+    """
+
+    def __init__(self, hass: HomeAssistant, device_manager: PulsarManager) -> None:
+        super().__init__(
+            hass,
+            _LOGGER,
+            name=f"{DOMAIN} {device_manager.device_or_address}",
+            update_interval=DEFAULT_SCAN_INTERVAL,
+        )
+        self._device_manager = device_manager
+        self._staggered_refresh_running = False
+
+    @property
+    def device_manager(self) -> PulsarManager:
+        return self._device_manager
+
+    def requested_keys(self) -> dict[str, list[str]]:
+        """Return data keys requested by listening entities, grouped by device id"""
+        keys: dict[str, list[str]] = {}
+        for context in self.async_contexts():
+            if context is None:
+                continue
+            dev_id, key = context
+            dev_keys = keys.setdefault(dev_id, [])
+            if key not in dev_keys:
+                dev_keys.append(key)
+        return keys
+
+    async def _async_update_data(self) -> dict[str, dict[str, CachedReading | None]]:
+        """Read the expired keys of all devices at once, the bus scheduler orders the requests"""
+        if self._staggered_refresh_running:
+            # the first refresh is still reading the devices one by one,
+            # reading them here too would put every request on the bus twice
+            return self.data or {}
+        requested_keys = self.requested_keys()
+        try:
+            results = await asyncio.gather(*(
+                self._async_update_device(dev_id, keys)
+                for dev_id, keys in requested_keys.items()
+            ))
+        finally:
+            self._device_manager.async_save_timeouts()
+
+        data: dict[str, dict[str, CachedReading | None]] = {}
+        failed = 0
+        total = 0
+        for dev_id, (readings, dev_total, dev_failed) in zip(requested_keys, results):
+            if readings is not None:
+                data[dev_id] = readings
+            total += dev_total
+            failed += dev_failed
+
+        if total > 0 and failed == total:
+            raise UpdateFailed("no device on the bus responded")
+
+        return data
+
+    async def async_staggered_refresh(self) -> None:
+        """First refresh after startup, publishing every device as soon as it is read
+
+        Entities show the readings restored from before the restart until
+        then, so devices that have nothing restored are read first. The
+        entities of the devices not read yet see the same readings and
+        write nothing. A scheduled refresh that comes due meanwhile is
+        skipped.
+        """
+        requested_keys = self.requested_keys()
+        now = dt_util.utcnow()
+
+        def has_restored(dev_id: str) -> bool:
+            device = self._device_manager.get_device(dev_id)
+            return device is not None and all(
+                device.cache.get(key, now) is not None for key in requested_keys[dev_id])
+
+        data = dict(self.data or {})
+        failed = 0
+        total = 0
+        self._staggered_refresh_running = True
+        try:
+            for dev_id in sorted(requested_keys, key=has_restored):
+                readings, dev_total, dev_failed = await self._async_update_device(
+                    dev_id, requested_keys[dev_id])
+                total += dev_total
+                failed += dev_failed
+                if readings is None:
+                    continue
+                data[dev_id] = readings
+                self.data = data
+                self.async_update_listeners()
+        finally:
+            self._staggered_refresh_running = False
+            self._device_manager.async_save_timeouts()
+
+        if total > 0 and failed == total:
+            self.async_set_update_error(UpdateFailed("no device on the bus responded"))
+        else:
+            # schedules the next cycle and updates the entities of the bus
+            self.async_set_updated_data(data)
+
+    async def _async_update_device(
+            self,
+            dev_id: str,
+            keys: list[str]) -> tuple[dict[str, CachedReading | None] | None, int, int]:
+        """Read the expired keys of a device
+
+        Returns the cached readings of keys and the number of reads tried and failed.
+        """
+        device = self._device_manager.get_device(dev_id)
+        if device is None:
+            return None, 0, 0
+
+        failed = 0
+        total = 0
+        cache = device.cache
+        now = dt_util.utcnow()
+        expired_keys = cache.expired_keys(keys, now)
+        if expired_keys:
+            values = await device.getdata_many(expired_keys)
+            now = dt_util.utcnow()
+            for key, value in values.items():
+                total += 1
+                if isinstance(value, DeviceUnavailable):
+                    # the breaker already logged when the device stopped answering
+                    _LOGGER.debug(f"Skipped {key} of {device.name}: {value}")
+                    cache.mark_failed(key, now)
+                    failed += 1
+                elif isinstance(value, Exception):
+                    _LOGGER.error(
+                        f"Unable to read {key} from {device.name}: {value}")
+                    cache.mark_failed(key, now)
+                    failed += 1
+                else:
+                    cache.update(key, value, now)
+
+        return {key: cache.get(key, now) for key in keys}, total, failed
@@ -0,0 +1,55 @@
+"""Diagnostics support for Pulsar."""
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+import homeassistant.util.dt as dt_util
+
+from . import HomeAssistantPulsarData
+from .const import DOMAIN
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return the bus counters and the state of every meter of a config entry."""
+    hass_data: HomeAssistantPulsarData = hass.data[DOMAIN][entry.entry_id]
+    device_manager = hass_data.device_manager
+    bus = device_manager.bus
+    connector = bus.connector
+    now = dt_util.utcnow()
+
+    devices = {}
+    for dev_id, device in device_manager.get_devices(None).items():
+        readings = {}
+        for key in hass_data.coordinator.requested_keys().get(dev_id, []):
+            reading = device.cache.get(key, now)
+            readings[key] = None if reading is None else {
+                "value": str(reading.value),
+                "timestamp": reading.timestamp.isoformat(),
+                "quality": reading.quality.value,
+            }
+        devices[dev_id] = {
+            "name": device.name,
+            "type": device.type,
+            "addr": device.addr,
+            "health": device.health.state.value,
+            "consecutive_failures": device.health.failures,
+            "reply_timeout": round(connector.timeouts.timeout(device.addr), 3),
+            "pending": bus.pending(device.addr),
+            "readings": readings,
+        }
+
+    return {
+        "config_entry": entry.as_dict(),
+        "bus": {
+            "device_or_address": connector.device_or_address,
+            "connected": connector.is_connected,
+            "pending": bus.pending(),
+            "coordinator_last_update_success": hass_data.coordinator.last_update_success,
+            "metrics": connector.metrics.as_dict(),
+        },
+        "devices": devices,
+    }
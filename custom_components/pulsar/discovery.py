@@ -0,0 +1,105 @@
+"""Discovery of the meters answering on a bus"""
+from __future__ import annotations
+
+from collections.abc import Callable
+import itertools
+import logging
+import re
+
+from . import codec
+from .pulsar_m_water import PulsarM
+from .scheduler import BusScheduler, Priority
+
+_LOGGER = logging.getLogger(__name__)
+
+# upper limit of the wait for a probe reply, a learned timeout that is
+# shorter is used as is
+DEFAULT_PROBE_TIMEOUT = 0.5
+# serial numbers are 8 BCD digits
+MAX_SERIAL_ID = 99999999
+# guards against a typo turning into a scan of days
+MAX_SCAN_ADDRESSES = 10000
+
+# reading the system time is the cheapest request every meter answers
+PROBE_FUNCTION = PulsarM.FUNCTION_READ_SYSTEM_TIME[0]
+PROBE_RESPONSE_SIZE = 6 + codec.SERVICE_SIZE
+
+_request_ids = itertools.count()
+
+ProgressCallback = Callable[[int, int], None]
+
+
+def parse_serial_ids(text: str) -> list[int]:
+    """Parses a list of serial numbers and ranges like "12345670-12345699, 12345800"
+
+    Raises ValueError on a malformed list or one that is too long.
+    """
+    addresses: dict[int, None] = {}
+    for part in re.split(r"[,;\s]+", text.strip()):
+        if not part:
+            continue
+        first, sep, last = part.partition("-")
+        start = int(first)
+        end = int(last) if sep else start
+        if not 0 < start <= end <= MAX_SERIAL_ID:
+            raise ValueError(f"invalid serial number range {part}")
+        if len(addresses) + end - start + 1 > MAX_SCAN_ADDRESSES:
+            raise ValueError("too many serial numbers")
+        addresses.update(dict.fromkeys(range(start, end + 1)))
+    if not addresses:
+        raise ValueError("no serial numbers")
+    return list(addresses)
+
+
+def _is_error_reply(frame, addr: int) -> bool:
+    return len(frame) > codec.SERVICE_SIZE and frame[codec.FUNC_OFFSET] == codec.FUNCTION_ERROR \
+        and codec.frame_crc_ok(frame) and codec.frame_addr(frame) == addr
+
+
+async def async_probe(
+        bus: BusScheduler,
+        addr: int,
+        probe_timeout: float = DEFAULT_PROBE_TIMEOUT) -> bool:
+    """Returns True if a meter answers on addr
+
+    A meter that replies with an error frame is there all the same. A reply
+    that is garbled (two meters answering, noise) is probed once more.
+    """
+    for _ in range(2):
+        request_id = next(_request_ids) & 0xFFFF
+        message = codec.encode_frame(b"", PROBE_FUNCTION, addr, request_id)
+        response = await bus.request(
+            addr, message, Priority.background, reply_timeout=probe_timeout)
+        if not response:
+            return False
+        try:
+            codec.check_frame(response, PROBE_RESPONSE_SIZE, addr, request_id)
+        except Exception as ex:
+            if _is_error_reply(response, addr):
+                return True
+            _LOGGER.debug(f"Garbled reply from {addr}: {ex}")
+            continue
+        return True
+    return False
+
+
+async def async_scan_bus(
+        bus: BusScheduler,
+        addresses: list[int],
+        progress_callback: ProgressCallback | None = None,
+        probe_timeout: float = DEFAULT_PROBE_TIMEOUT) -> list[int]:
+    """Probes addresses one after the other and returns those that answered
+
+    Probes go at background priority, so a bus that is already polled keeps
+    its consumption reads going during a scan. Cancelling the task stops
+    the scan after the probe in flight.
+    """
+    found = []
+    total = len(addresses)
+    for done, addr in enumerate(addresses, 1):
+        if await async_probe(bus, addr, probe_timeout):
+            _LOGGER.debug(f"Found meter {addr} on {bus.connector.device_or_address}")
+            found.append(addr)
+        if progress_callback is not None:
+            progress_callback(done, total)
+    return found
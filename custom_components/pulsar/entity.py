@@ -4,11 +4,16 @@ from __future__ import annotations
 import asyncio
 from collections.abc import Callable
 import logging
+import time
 from typing import Any
 
 from homeassistant.core import callback
 from homeassistant.helpers import entity
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+import homeassistant.util.dt as dt_util
 
+from .cache import CachedReading
+from .coordinator import PulsarDataUpdateCoordinator
 from .pulsar_m_water import PulsarM
 from .pulsardevice import PulsarDevice
 
@@ -19,25 +24,92 @@ from .const import (
 _LOGGER = logging.getLogger(__name__)
 
 
-class BasePulsarEntity(entity.Entity):
+class BasePulsarEntity(CoordinatorEntity[PulsarDataUpdateCoordinator]):
 
-    def __init__(self, unique_id: str, pulsar_device: PulsarDevice, **kwargs: Any) -> None:
+    def __init__(
+            self,
+            coordinator: PulsarDataUpdateCoordinator,
+            unique_id: str,
+            pulsar_device: PulsarDevice,
+            data_key: str | None = None,
+            **kwargs: Any) -> None:
         """Init Pulsar entity."""
+        super().__init__(
+            coordinator, None if data_key is None else (unique_id, data_key))
         self._attr_unique_id: str = f"pulsar.{unique_id}"
         self._unique_id = unique_id
         self._name: str = pulsar_device.name
         self._state: Any = None
-        self._attr_should_poll = True
+        self._attr_should_poll = False
         self._extra_state_attributes: dict[str, Any] = {}
         self._pulsar_device = pulsar_device
         self._unsubs: list[Callable[[], None]] = []
         self.remove_future: asyncio.Future[Any] = asyncio.Future()
+        # an unchanged state is written again after this many seconds, 0 never
+        self._force_update_interval = 0.0
+        self._written_state: tuple[Any, ...] | None = None
+        self._written_at = 0.0
+        self._heartbeat = False
+
+    @property
+    def force_update(self) -> bool:
+        """Only the heartbeat write of an unchanged state is forced."""
+        return self._heartbeat
+
+    def _published_state(self) -> tuple[Any, ...]:
+        """What a state write would show"""
+        if not self.available:
+            return (False,)
+        return (True, self.state, tuple(sorted((self.extra_state_attributes or {}).items())))
+
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+        # the platform writes this state right after
+        self._written_state = self._published_state()
+        self._written_at = time.monotonic()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Write the state only if it changed, or if the heartbeat is due.
+
+        Most polls bring back the same meter total, writing it again would
+        only cost a state change event and a recorder row.
+        """
+        state = self._published_state()
+        now = time.monotonic()
+        if state == self._written_state:
+            if not self._force_update_interval or \
+                    now - self._written_at < self._force_update_interval:
+                return
+            self._heartbeat = True
+        self._written_state = state
+        self._written_at = now
+        try:
+            self.async_write_ha_state()
+        finally:
+            self._heartbeat = False
 
     @property
     def pulsar_device(self) -> PulsarDevice:
         """Return the Pulsar device this entity is attached to."""
         return self._pulsar_device
 
+    def coordinator_reading(self, key: str) -> CachedReading | None:
+        """Return the cached reading of this device for key
+
+        Until the coordinator has read the device, this is the reading
+        restored from before the restart, if any.
+        """
+        data = self.coordinator.data
+        if data is None or self._unique_id not in data:
+            return self._pulsar_device.cache.get(key, dt_util.utcnow())
+        return data[self._unique_id].get(key)
+
+    def coordinator_value(self, key: str) -> Any:
+        """Return the cached value of this device for key"""
+        reading = self.coordinator_reading(key)
+        return None if reading is None else reading.value
+
     @property
     def extra_state_attributes(self) -> dict[str, Any]:
         """Return device specific state attributes."""
@@ -49,7 +121,7 @@ class BasePulsarEntity(entity.Entity):
         return entity.DeviceInfo(
             identifiers={(DOMAIN, self._unique_id)},
             manufacturer="Pulsar",
-            model=self._pulsar_device._type,
+            model=self._pulsar_device.model,
             name=self._pulsar_device._name
         )
 
@@ -82,5 +154,10 @@ class BasePulsarEntity(entity.Entity):
 
 
 class PulsarMEntity(BasePulsarEntity):
-    def __init__(self, unique_id: str, pulsar_device: PulsarM, **kwargs: Any) -> None:
-        super().__init__(unique_id, pulsar_device, **kwargs)
+    def __init__(
+            self,
+            coordinator: PulsarDataUpdateCoordinator,
+            unique_id: str,
+            pulsar_device: PulsarM,
+            **kwargs: Any) -> None:
+        super().__init__(coordinator, unique_id, pulsar_device, **kwargs)
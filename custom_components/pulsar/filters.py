@@ -0,0 +1,92 @@
+"""Deadband and rate limit applied to sensor values before they reach the state machine"""
+from __future__ import annotations
+
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Any
+
+from homeassistant.components.sensor import (
+    SensorDeviceClass,
+    SensorEntityDescription,
+    SensorStateClass,
+)
+
+from .const import (
+    CONF_CONSUMPTION_DEADBAND,
+    CONF_MIN_PUBLISH_INTERVAL,
+    CONF_TEMPERATURE_DEADBAND,
+    DEFAULT_CONSUMPTION_DEADBAND,
+    DEFAULT_MIN_PUBLISH_INTERVAL,
+    DEFAULT_TEMPERATURE_DEADBAND,
+)
+
+# battery voltage sags and recovers with every radio burst of the meter
+VOLTAGE_RELATIVE_DEADBAND = 0.01
+
+
+@dataclass(frozen=True)
+class Deadband:
+    """Change a value must make, and time that must pass, before it is published
+
+    A numeric value is published once it moved by at least the larger of
+    absolute and relative times the published value. Any value waits at
+    least min_interval seconds after the last one published.
+    """
+
+    absolute: float = 0.0
+    relative: float = 0.0
+    min_interval: float = 0.0
+
+
+def sensor_deadband(description: SensorEntityDescription, options: Mapping[str, Any]) -> Deadband:
+    """Deadband of a sensor, from the entry options for its kind of value"""
+    min_interval = float(options.get(CONF_MIN_PUBLISH_INTERVAL, DEFAULT_MIN_PUBLISH_INTERVAL))
+    if description.device_class == SensorDeviceClass.TEMPERATURE:
+        return Deadband(
+            absolute=float(options.get(CONF_TEMPERATURE_DEADBAND, DEFAULT_TEMPERATURE_DEADBAND)),
+            min_interval=min_interval)
+    if description.state_class == SensorStateClass.TOTAL_INCREASING:
+        return Deadband(
+            absolute=float(options.get(CONF_CONSUMPTION_DEADBAND, DEFAULT_CONSUMPTION_DEADBAND)),
+            min_interval=min_interval)
+    if description.device_class == SensorDeviceClass.VOLTAGE:
+        return Deadband(relative=VOLTAGE_RELATIVE_DEADBAND, min_interval=min_interval)
+    return Deadband(min_interval=min_interval)
+
+
+class PublishFilter():
+    """Keeps the last published value of a sensor and decides on the next one"""
+
+    __slots__ = ("_deadband", "_value", "_published_at", "_published")
+
+    def __init__(self, deadband: Deadband) -> None:
+        self._deadband = deadband
+        self._value: Any = None
+        self._published_at = 0.0
+        self._published = False
+
+    @property
+    def value(self) -> Any:
+        """Last published value"""
+        return self._value
+
+    def update(self, value: Any, now: float) -> Any:
+        """Takes a new reading taken at monotonic time now, returns the value to publish"""
+        if value == self._value and self._published:
+            return self._value
+        if self._published and value is not None and self._value is not None:
+            deadband = self._deadband
+            if now - self._published_at < deadband.min_interval:
+                return self._value
+            if _is_number(value) and _is_number(self._value):
+                threshold = max(deadband.absolute, deadband.relative * abs(self._value))
+                if abs(value - self._value) < threshold:
+                    return self._value
+        self._value = value
+        self._published_at = now
+        self._published = True
+        return value
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
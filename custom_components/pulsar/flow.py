@@ -0,0 +1,73 @@
+"""Flow rate of a counter, derived from the readings the coordinator takes anyway"""
+from __future__ import annotations
+
+from collections import deque
+
+from .const import DEFAULT_SCAN_INTERVAL
+
+# samples kept per channel, enough for a window of several poll intervals
+FLOW_RATE_SAMPLES = 32
+# poll intervals without a reading that end the samples, so a late poll
+# does not throw away a window shorter than a few of them
+GAP_SCAN_INTERVALS = 3
+
+
+class FlowRate():
+    """Rate of a counter over a sliding window of its last samples
+
+    Samples are kept with the running total of the counter rather than its
+    value, so a counter that was reset or replaced does not make the rate
+    negative: a reading below the previous one counts from zero again.
+    Adding a sample and reading the rate take constant time.
+
+    A gap of more than the window, and at least GAP_SCAN_INTERVALS poll
+    intervals, between readings starts the samples over, and no rate is
+    given once the last reading is that old.
+    """
+
+    __slots__ = ("_window", "_gap", "_samples", "_counter", "_total")
+
+    def __init__(self, window: float, capacity: int = FLOW_RATE_SAMPLES) -> None:
+        # seconds
+        self._window = window
+        self._gap = max(window, GAP_SCAN_INTERVALS * DEFAULT_SCAN_INTERVAL.total_seconds())
+        # (monotonic time, running total), oldest first
+        self._samples: deque[tuple[float, float]] = deque(maxlen=capacity)
+        self._counter = 0.0
+        self._total = 0.0
+
+    def add(self, timestamp: float, counter: float) -> None:
+        """Takes a reading of the counter at monotonic time timestamp"""
+        samples = self._samples
+        if samples:
+            last_time = samples[-1][0]
+            if timestamp <= last_time:
+                # out of order, a later reading is already in
+                return
+            if timestamp - last_time > self._gap:
+                # after a gap the old samples say nothing about the flow now
+                samples.clear()
+            else:
+                delta = counter - self._counter
+                self._total += delta if delta >= 0 else counter
+        self._counter = counter
+        samples.append((timestamp, self._total))
+
+        # keep one sample at or before the start of the window
+        horizon = timestamp - self._window
+        while len(samples) > 2 and samples[1][0] <= horizon:
+            samples.popleft()
+
+    def rate(self, now: float) -> float | None:
+        """Counter units per second over the window at monotonic time now
+
+        None until two samples are in and after a gap in the readings.
+        """
+        samples = self._samples
+        if len(samples) < 2:
+            return None
+        first_time, first_total = samples[0]
+        last_time, last_total = samples[-1]
+        if now - last_time > self._gap:
+            return None
+        return (last_total - first_total) / (last_time - first_time)
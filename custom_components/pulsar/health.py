@@ -0,0 +1,111 @@
+"""Health of a device, so a meter that does not answer stops holding the bus"""
+from __future__ import annotations
+
+import enum
+import logging
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+# consecutive failed requests that open the circuit
+OPEN_AFTER_FAILURES = 3
+# how long an open circuit waits before a probe, doubled after every failed probe
+OPEN_MIN_DELAY = 60.0
+OPEN_MAX_DELAY = 3600.0
+
+
+class HealthState(enum.Enum):
+    """Circuit breaker state of a device"""
+
+    # answers every request
+    healthy = "healthy"
+    # failed its last requests, but not enough of them to give up
+    degraded = "degraded"
+    # requests fail at once without touching the bus
+    open = "open"
+    # one probe request is let through to see whether the device is back
+    half_open = "half_open"
+
+
+class DeviceUnavailable(Exception):
+    """Request refused because the circuit of the device is open"""
+
+
+class DeviceHealth():
+    """Circuit breaker over the requests of a device
+
+    OPEN_AFTER_FAILURES consecutive failures open the circuit. While open,
+    requests are refused without going to the bus. Once the open delay has
+    passed a single request goes through as a probe: an answer closes the
+    circuit, a failure opens it again for twice as long.
+    """
+
+    def __init__(self, name: str) -> None:
+        self._name = name
+        self._state = HealthState.healthy
+        self._failures = 0
+        self._delay = OPEN_MIN_DELAY
+        self._retry_at = 0.0
+
+    @property
+    def state(self) -> HealthState:
+        return self._state
+
+    @property
+    def failures(self) -> int:
+        return self._failures
+
+    @property
+    def is_available(self) -> bool:
+        return self._state in (HealthState.healthy, HealthState.degraded)
+
+    def retry_in(self) -> float:
+        return max(self._retry_at - time.monotonic(), 0.0)
+
+    def allow_request(self) -> bool:
+        """Returns False if a request must fail without going to the bus"""
+        if self._state is HealthState.open:
+            if time.monotonic() < self._retry_at:
+                return False
+            self._state = HealthState.half_open
+            return True
+        # only the probe goes through while half open
+        return self._state is not HealthState.half_open
+
+    def check(self) -> None:
+        """Raises DeviceUnavailable if a request must not go to the bus"""
+        if not self.allow_request():
+            raise DeviceUnavailable(
+                f"not answering, next try in {self.retry_in():.0f} s")
+
+    def record_success(self) -> None:
+        if self._state is not HealthState.healthy:
+            if not self.is_available:
+                _LOGGER.info(f"{self._name} answers again")
+            self._state = HealthState.healthy
+        self._failures = 0
+        self._delay = OPEN_MIN_DELAY
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self._state is HealthState.half_open:
+            self._delay = min(self._delay * 2, OPEN_MAX_DELAY)
+            self._open()
+        elif self._failures >= OPEN_AFTER_FAILURES:
+            if self._state is not HealthState.open:
+                self._open()
+                _LOGGER.warning(
+                    f"{self._name} did not answer {self._failures} times, "
+                    f"polling it again in {self._delay:.0f} s")
+        else:
+            self._state = HealthState.degraded
+
+    def record_not_sent(self) -> None:
+        """Request that never reached the device, a probe is retried with the next request"""
+        if self._state is HealthState.half_open:
+            self._state = HealthState.open
+            self._retry_at = 0.0
+
+    def _open(self) -> None:
+        self._state = HealthState.open
+        self._retry_at = time.monotonic() + self._delay
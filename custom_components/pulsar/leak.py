@@ -0,0 +1,153 @@
+"""Leak checks run on the consumption readings of a water meter channel"""
+from __future__ import annotations
+
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Any
+
+from .const import (
+    CONF_BURST_FLOW,
+    CONF_CONTINUOUS_FLOW_HOURS,
+    CONF_QUIET_HOURS_END,
+    CONF_QUIET_HOURS_START,
+    CONF_QUIET_HOURS_VOLUME,
+    DEFAULT_BURST_FLOW,
+    DEFAULT_CONTINUOUS_FLOW,
+    DEFAULT_QUIET_HOURS_END,
+    DEFAULT_QUIET_HOURS_START,
+    DEFAULT_QUIET_HOURS_VOLUME,
+)
+
+# seconds without consumption that end a flow, a slow drip moves a
+# liter counter only every few polls
+FLOW_GAP = 15 * 60
+# seconds the burst rate is averaged over, shorter intervals between
+# readings would turn a single liter into a burst
+BURST_MIN_INTERVAL = 30
+
+
+@dataclass(frozen=True)
+class LeakSettings:
+    """Thresholds of the leak checks
+
+    continuous_flow is in seconds, quiet hours are local hours of the day
+    with the end excluded and no quiet hours if they are equal, the quiet
+    hours volume is in liters and the burst flow in liters per minute.
+    """
+
+    continuous_flow: float = DEFAULT_CONTINUOUS_FLOW.total_seconds()
+    quiet_hours_start: int = DEFAULT_QUIET_HOURS_START
+    quiet_hours_end: int = DEFAULT_QUIET_HOURS_END
+    quiet_hours_volume: float = DEFAULT_QUIET_HOURS_VOLUME
+    burst_flow: float = DEFAULT_BURST_FLOW
+
+    def is_quiet(self, hour: int) -> bool:
+        start, end = self.quiet_hours_start, self.quiet_hours_end
+        if start <= end:
+            return start <= hour < end
+        # over midnight
+        return hour >= start or hour < end
+
+
+def leak_settings(options: Mapping[str, Any]) -> LeakSettings:
+    """Leak check thresholds from the entry options"""
+    return LeakSettings(
+        continuous_flow=float(options.get(
+            CONF_CONTINUOUS_FLOW_HOURS, DEFAULT_CONTINUOUS_FLOW.total_seconds() / 3600)) * 3600,
+        quiet_hours_start=int(options.get(CONF_QUIET_HOURS_START, DEFAULT_QUIET_HOURS_START)),
+        quiet_hours_end=int(options.get(CONF_QUIET_HOURS_END, DEFAULT_QUIET_HOURS_END)),
+        quiet_hours_volume=float(options.get(CONF_QUIET_HOURS_VOLUME, DEFAULT_QUIET_HOURS_VOLUME)),
+        burst_flow=float(options.get(CONF_BURST_FLOW, DEFAULT_BURST_FLOW)))
+
+
+class LeakDetector():
+    """Leak checks of one counter, updated with every reading
+
+    Keeps a handful of numbers rather than a history, so a reading is
+    checked in constant time and memory:
+
+    - continuous_flow, the counter has not stood still for FLOW_GAP
+      over the last continuous flow seconds, a gap of more than FLOW_GAP
+      between readings ends a flow
+    - quiet_hours_flow, more than the quiet hours volume was used since
+      the quiet hours began
+    - burst, the flow over the last BURST_MIN_INTERVAL seconds or more
+      reached the burst flow
+
+    Like FlowRate, a reading below the previous one counts as a reset of
+    the counter and out-of-order readings are ignored.
+    """
+
+    __slots__ = (
+        "_settings", "_last_time", "_counter", "_total", "_flowing_since",
+        "_last_flow", "_quiet_start_total", "_burst_time", "_burst_total",
+        "continuous_flow", "quiet_hours_flow", "burst")
+
+    def __init__(self, settings: LeakSettings) -> None:
+        self._settings = settings
+        # monotonic time and value of the last reading
+        self._last_time: float | None = None
+        self._counter = 0.0
+        # consumption since the first reading, not lowered by resets
+        self._total = 0.0
+        self._flowing_since: float | None = None
+        self._last_flow = 0.0
+        self._quiet_start_total: float | None = None
+        self._burst_time = 0.0
+        self._burst_total = 0.0
+        self.continuous_flow = False
+        self.quiet_hours_flow = False
+        self.burst = False
+
+    @property
+    def ready(self) -> bool:
+        """Whether a reading was taken, the checks say nothing before"""
+        return self._last_time is not None
+
+    def add(self, timestamp: float, hour: int, counter: float) -> None:
+        """Takes a reading of the counter at monotonic time timestamp and local hour hour"""
+        settings = self._settings
+        last_time = self._last_time
+        if last_time is None:
+            self._last_time = self._burst_time = timestamp
+            self._counter = counter
+        elif timestamp <= last_time:
+            return
+        else:
+            delta = counter - self._counter
+            if delta < 0:
+                delta = counter
+            self._last_time = timestamp
+            self._counter = counter
+            self._total += delta
+
+            if timestamp - last_time > FLOW_GAP:
+                # nothing says the flow went on through a gap in the
+                # readings, a flow after it starts with this reading
+                self._flowing_since = timestamp if delta > 0 else None
+                self._last_flow = timestamp
+            elif delta > 0:
+                if self._flowing_since is None:
+                    self._flowing_since = last_time
+                self._last_flow = timestamp
+            elif self._flowing_since is not None and timestamp - self._last_flow >= FLOW_GAP:
+                self._flowing_since = None
+            self.continuous_flow = self._flowing_since is not None and \
+                timestamp - self._flowing_since >= settings.continuous_flow
+
+            interval = timestamp - self._burst_time
+            if interval >= BURST_MIN_INTERVAL:
+                rate = (self._total - self._burst_total) / interval * 60
+                self.burst = rate >= settings.burst_flow
+                self._burst_time = timestamp
+                self._burst_total = self._total
+
+        if settings.is_quiet(hour):
+            # what flowed before the first reading of the quiet hours is not counted
+            if self._quiet_start_total is None:
+                self._quiet_start_total = self._total
+            self.quiet_hours_flow = \
+                self._total - self._quiet_start_total > settings.quiet_hours_volume
+        else:
+            self._quiet_start_total = None
+            self.quiet_hours_flow = False
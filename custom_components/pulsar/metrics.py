@@ -0,0 +1,160 @@
+"""Counters of the traffic on a bus and of every meter on it"""
+from __future__ import annotations
+
+import time
+from typing import Any
+
+from .timeouts import RttHistogram
+
+# utilization is not recomputed over windows shorter than this
+MIN_UTILIZATION_WINDOW = 10
+
+
+class LinkCounters():
+    """Traffic with one meter, or with all of them
+
+    Plain integer attributes, so counting a transaction costs a few
+    additions and the counters can stay on all the time.
+    """
+
+    __slots__ = (
+        "transactions", "bytes_out", "bytes_in", "timeouts", "truncated",
+        "crc_errors", "length_errors", "address_mismatches",
+        "request_id_mismatches", "device_errors", "stale_replies", "rtt")
+
+    def __init__(self) -> None:
+        self.transactions = 0
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.timeouts = 0
+        self.truncated = 0
+        self.crc_errors = 0
+        self.length_errors = 0
+        self.address_mismatches = 0
+        self.request_id_mismatches = 0
+        self.device_errors = 0
+        # late replies to earlier requests, dropped while waiting for a reply
+        self.stale_replies = 0
+        self.rtt = RttHistogram()
+
+    @property
+    def errors(self) -> int:
+        """Transactions that did not bring back a valid reply"""
+        return self.timeouts + self.truncated + self.crc_errors + self.length_errors \
+            + self.address_mismatches + self.request_id_mismatches
+
+    def rtt_ms(self, fraction: float) -> float | None:
+        rtt = self.rtt.percentile(fraction)
+        return None if rtt is None else round(rtt * 1000, 1)
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "transactions": self.transactions,
+            "bytes_out": self.bytes_out,
+            "bytes_in": self.bytes_in,
+            "timeouts": self.timeouts,
+            "truncated": self.truncated,
+            "crc_errors": self.crc_errors,
+            "length_errors": self.length_errors,
+            "address_mismatches": self.address_mismatches,
+            "request_id_mismatches": self.request_id_mismatches,
+            "device_errors": self.device_errors,
+            "stale_replies": self.stale_replies,
+            "errors": self.errors,
+            "rtt_p50_ms": self.rtt_ms(0.5),
+            "rtt_p99_ms": self.rtt_ms(0.99),
+        }
+
+
+# which counter a failed check of codec.check_frame goes to
+FRAME_ERROR_COUNTERS = {
+    "truncated": "truncated",
+    "length": "length_errors",
+    "crc": "crc_errors",
+    "address": "address_mismatches",
+    "request_id": "request_id_mismatches",
+    "device_error": "device_errors",
+}
+
+
+class BusMetrics():
+    """Counters of a connector, in total and per meter address"""
+
+    def __init__(self) -> None:
+        self.total = LinkCounters()
+        self.meters: dict[int, LinkCounters] = {}
+        self.connects = 0
+        self._busy = 0.0
+        self._utilization = 0.0
+        self._window_start = time.monotonic()
+        self._window_busy = 0.0
+
+    def meter(self, addr: int) -> LinkCounters:
+        counters = self.meters.get(addr)
+        if counters is None:
+            counters = self.meters[addr] = LinkCounters()
+        return counters
+
+    @property
+    def reconnects(self) -> int:
+        return max(self.connects - 1, 0)
+
+    def record_connect(self) -> None:
+        self.connects += 1
+
+    def record_transaction(
+            self,
+            addr: int,
+            bytes_out: int,
+            bytes_in: int,
+            rtt: float | None,
+            busy: float,
+            stale_replies: int = 0,
+            address_mismatches: int = 0,
+            probe: bool = False) -> None:
+        """Counts a request that went over the line and held it for busy seconds
+
+        A probe nobody answered only counts towards the total, so a bus scan
+        leaves no counters behind for the serial numbers it tried in vain.
+        """
+        self._busy += busy
+        if probe and rtt is None and addr not in self.meters:
+            meters = (self.total,)
+        else:
+            meters = (self.total, self.meter(addr))
+        for counters in meters:
+            counters.transactions += 1
+            counters.bytes_out += bytes_out
+            counters.bytes_in += bytes_in
+            counters.stale_replies += stale_replies
+            counters.address_mismatches += address_mismatches
+            if rtt is None:
+                counters.timeouts += 1
+            else:
+                counters.rtt.add(rtt)
+
+    def record_frame_error(self, addr: int, kind: str) -> None:
+        """Counts a reply that arrived but failed a check of codec.check_frame"""
+        attr = FRAME_ERROR_COUNTERS.get(kind)
+        if attr is None:
+            return
+        for counters in (self.total, self.meter(addr)):
+            setattr(counters, attr, getattr(counters, attr) + 1)
+
+    def utilization(self) -> float:
+        """Share of time the line was busy, in percent, over the last window"""
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        if elapsed >= MIN_UTILIZATION_WINDOW:
+            self._utilization = min((self._busy - self._window_busy) / elapsed * 100, 100.0)
+            self._window_start = now
+            self._window_busy = self._busy
+        return round(self._utilization, 1)
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            **self.total.as_dict(),
+            "reconnects": self.reconnects,
+            "utilization": self.utilization(),
+            "meters": {str(addr): counters.as_dict() for addr, counters in self.meters.items()},
+        }
@@ -0,0 +1,109 @@
+"""Parameters of Pulsar meters read by function 0x0A"""
+from __future__ import annotations
+
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+from homeassistant.components.sensor import (
+    SensorDeviceClass,
+    SensorEntityDescription,
+    SensorStateClass,
+)
+from homeassistant.const import (
+    EntityCategory,
+    UnitOfElectricPotential,
+    UnitOfTemperature,
+)
+
+from . import codec
+from .const import (
+    DATA_KEY_BATTERY_VOLTAGE,
+    DATA_KEY_DAYLIGHT_SAVING_TIME,
+    DATA_KEY_DEVICE_TEMPERATURE,
+    DATA_KEY_DIAGNOSTIC_FLAGS,
+)
+
+# request payload is the parameter code, the reply holds the value
+# in its first bytes whatever the parameter
+PARAM_CODE_SIZE = 2
+PARAM_VALUE_SIZE = 8
+
+
+def _flag(payload) -> bool:
+    return bool(payload[0])
+
+
+def _byte(payload) -> int:
+    return payload[0]
+
+
+def _float(payload) -> float:
+    return codec.read_float_from_hex(payload, 4, 0, False)
+
+
+@dataclass(frozen=True)
+class Parameter:
+    """Parameter code with the data key and the decoder of its value
+
+    Parameters with a description get a sensor entity.
+    """
+
+    code: int
+    key: str
+    decode: Callable[[Any], Any]
+    description: SensorEntityDescription | None = None
+
+
+PARAMETERS: tuple[Parameter, ...] = (
+    Parameter(
+        code=1,
+        key=DATA_KEY_DAYLIGHT_SAVING_TIME,
+        decode=_flag
+    ),
+    Parameter(
+        code=6,
+        key=DATA_KEY_DIAGNOSTIC_FLAGS,
+        decode=_byte,
+        description=SensorEntityDescription(
+            key=DATA_KEY_DIAGNOSTIC_FLAGS,
+            name="Diagnostic flags",
+            translation_key=DATA_KEY_DIAGNOSTIC_FLAGS,
+            entity_category=EntityCategory.DIAGNOSTIC,
+            has_entity_name=True
+        )
+    ),
+    Parameter(
+        code=10,
+        key=DATA_KEY_BATTERY_VOLTAGE,
+        decode=_float,
+        description=SensorEntityDescription(
+            key=DATA_KEY_BATTERY_VOLTAGE,
+            name="Battery voltage",
+            translation_key=DATA_KEY_BATTERY_VOLTAGE,
+            device_class=SensorDeviceClass.VOLTAGE,
+            state_class=SensorStateClass.MEASUREMENT,
+            native_unit_of_measurement=UnitOfElectricPotential.VOLT,
+            suggested_display_precision=2,
+            entity_category=EntityCategory.DIAGNOSTIC,
+            has_entity_name=True
+        )
+    ),
+    Parameter(
+        code=11,
+        key=DATA_KEY_DEVICE_TEMPERATURE,
+        decode=_float,
+        description=SensorEntityDescription(
+            key=DATA_KEY_DEVICE_TEMPERATURE,
+            name="Temperature of meter",
+            translation_key=DATA_KEY_DEVICE_TEMPERATURE,
+            device_class=SensorDeviceClass.TEMPERATURE,
+            state_class=SensorStateClass.MEASUREMENT,
+            native_unit_of_measurement=UnitOfTemperature.CELSIUS,
+            has_entity_name=True
+        )
+    ),
+)
+
+PARAMETERS_BY_CODE = {param.code: param for param in PARAMETERS}
+PARAMETERS_BY_KEY = {param.key: param for param in PARAMETERS}
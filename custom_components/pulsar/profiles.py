@@ -0,0 +1,294 @@
+"""Declarative profiles of the Pulsar meter models
+
+All models speak the same Pulsar-M protocol and differ in what their
+channels hold, how channel values are encoded in replies of function 0x01
+and which parameters they have. A model is supported by adding a profile
+here, PulsarM reads any of them.
+"""
+from __future__ import annotations
+
+from collections.abc import Callable
+from dataclasses import dataclass
+import struct
+from typing import Any
+
+from homeassistant.components.sensor import (
+    SensorDeviceClass,
+    SensorEntityDescription,
+    SensorStateClass,
+)
+from homeassistant.const import (
+    UnitOfEnergy,
+    UnitOfPower,
+    UnitOfTemperature,
+    UnitOfVolume,
+    UnitOfVolumeFlowRate,
+)
+
+from . import codec
+from .const import (
+    DATA_KEY_CURRENT_WATER_CONSUMPTION,
+    DATA_KEY_CURRENT_WATER_CONSUMPTION_CH1,
+    DATA_KEY_FLOW_RATE,
+    DATA_KEY_HEAT_ENERGY,
+    DATA_KEY_HEAT_FLOW,
+    DATA_KEY_HEAT_POWER,
+    DATA_KEY_HEAT_VOLUME,
+    DATA_KEY_PULSE_COUNTER,
+    DATA_KEY_RETURN_TEMPERATURE,
+    DATA_KEY_SUPPLY_TEMPERATURE,
+    DATA_KEY_SYSTEM_TIME,
+    DATA_KEY_TEMPERATURE_DIFFERENCE,
+    MAX_CHANNELS,
+    PulsarType
+)
+from .parameters import PARAMETERS_BY_CODE
+
+# heat meters count in Gcal, which Home Assistant has no unit for
+GCAL_TO_GJ = 4.1868
+GCAL_PER_HOUR_TO_KW = 1163.0
+
+# the request of function 0x01 is the mask of the channels to read
+CHANNEL_MASK_SIZE = 4
+
+SYSTEM_TIME_DESCRIPTION = SensorEntityDescription(
+    key=DATA_KEY_SYSTEM_TIME,
+    name="System time",
+    translation_key=DATA_KEY_SYSTEM_TIME,
+    has_entity_name=True
+)
+
+
+@dataclass(frozen=True)
+class ChannelSpec:
+    """Channel of function 0x01 with the sensor of its value
+
+    The value read is multiplied by scale, to bring it to a unit Home
+    Assistant knows.
+    """
+
+    channel: int
+    description: SensorEntityDescription
+    scale: float = 1.0
+
+
+@dataclass(frozen=True)
+class DeviceProfile:
+    """What a Pulsar model measures and how it encodes it
+
+    Models with fixed channels list them in channels. Models whose channels
+    all measure the same, as many as the meter is configured with, give
+    numbered_channel instead, which describes the sensor of channel n.
+    """
+
+    type: str
+    model: str
+    # struct format of one channel value in replies of function 0x01
+    value_format: str
+    channels: tuple[ChannelSpec, ...] = ()
+    numbered_channel: Callable[[int], SensorEntityDescription] | None = None
+    # codes of parameters.PARAMETERS the model has
+    parameters: tuple[int, ...] = ()
+    # whether the archives of function 0x06 hold the channel values
+    archive: bool = False
+    # whether the channels are liter counters a flow rate is derived from
+    flow_rate: bool = False
+    # whether the channels of this model are checked for leaks
+    leak_detection: bool = False
+
+    def channel_specs(self, channels: int) -> tuple[ChannelSpec, ...]:
+        if self.numbered_channel is None:
+            return self.channels
+        return tuple(
+            ChannelSpec(ch, self.numbered_channel(ch)) for ch in range(1, channels + 1))
+
+    def flow_rate_specs(self, channels: int) -> tuple[ChannelSpec, ...]:
+        """Flow rate sensors, one per channel of a meter with channels channels"""
+        if not self.flow_rate:
+            return ()
+        return tuple(
+            ChannelSpec(spec.channel, _flow_rate_channel(spec.channel))
+            for spec in self.channel_specs(channels))
+
+    def sensor_descriptions(self, channels: int) -> tuple[SensorEntityDescription, ...]:
+        """Sensors of a meter of this model with channels channels"""
+        return (
+            *(spec.description for spec in self.channel_specs(channels)),
+            SYSTEM_TIME_DESCRIPTION,
+            *(PARAMETERS_BY_CODE[code].description for code in self.parameters
+              if PARAMETERS_BY_CODE[code].description is not None),
+        )
+
+
+class ReadPlan():
+    """Request payload and decoder of a read of several channels in one frame
+
+    Built once for every set of channels a meter is asked for, so a poll
+    only fills in the request ID and unpacks the reply in a single call.
+    """
+
+    __slots__ = ("payload", "response_size", "_channels", "_struct", "_scales")
+
+    def __init__(self, channels: list[int], value_format: str, scales: dict[int, float]) -> None:
+        mask = 0
+        for ch in channels:
+            if not 1 <= ch <= MAX_CHANNELS:
+                raise Exception("wrong channel number")
+            mask |= 1 << (ch - 1)
+        payload = bytearray(CHANNEL_MASK_SIZE)
+        codec.write_hex(mask, payload, CHANNEL_MASK_SIZE, 0, False)
+        self.payload = bytes(payload)
+        # the meter answers with the values of the requested channels
+        # in ascending channel order
+        self._channels = tuple(
+            ch for ch in range(1, MAX_CHANNELS + 1) if mask & (1 << (ch - 1)))
+        self._struct = struct.Struct("<" + value_format * len(self._channels))
+        self.response_size = self._struct.size
+        channel_scales = tuple(scales.get(ch, 1.0) for ch in self._channels)
+        self._scales = None if all(scale == 1.0 for scale in channel_scales) else channel_scales
+
+    def decode(self, payload) -> dict[int, Any]:
+        values = self._struct.unpack_from(payload, 0)
+        if self._scales is not None:
+            values = [value * scale for value, scale in zip(values, self._scales)]
+        return dict(zip(self._channels, values))
+
+
+def _water_channel(ch: int) -> SensorEntityDescription:
+    if ch == 1:
+        return SensorEntityDescription(
+            key=DATA_KEY_CURRENT_WATER_CONSUMPTION_CH1,
+            name="Current water consumption",
+            translation_key=DATA_KEY_CURRENT_WATER_CONSUMPTION_CH1,
+            device_class=SensorDeviceClass.WATER,
+            state_class=SensorStateClass.TOTAL_INCREASING,
+            native_unit_of_measurement=UnitOfVolume.LITERS,
+            has_entity_name=True
+        )
+    return SensorEntityDescription(
+        key=DATA_KEY_CURRENT_WATER_CONSUMPTION.format(ch),
+        name=f"Current water consumption ch{ch}",
+        device_class=SensorDeviceClass.WATER,
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        native_unit_of_measurement=UnitOfVolume.LITERS,
+        has_entity_name=True
+    )
+
+
+def _flow_rate_channel(ch: int) -> SensorEntityDescription:
+    key = DATA_KEY_FLOW_RATE.format(ch)
+    return SensorEntityDescription(
+        key=key,
+        name="Flow rate" if ch == 1 else f"Flow rate ch{ch}",
+        translation_key=key if ch == 1 else None,
+        device_class=SensorDeviceClass.VOLUME_FLOW_RATE,
+        state_class=SensorStateClass.MEASUREMENT,
+        native_unit_of_measurement=UnitOfVolumeFlowRate.LITERS_PER_MINUTE,
+        suggested_display_precision=2,
+        has_entity_name=True
+    )
+
+
+def _pulse_channel(ch: int) -> SensorEntityDescription:
+    # the unit is whatever the pulse weight of the channel is set up for
+    return SensorEntityDescription(
+        key=DATA_KEY_PULSE_COUNTER.format(ch),
+        name=f"Counter ch{ch}",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        has_entity_name=True
+    )
+
+
+WATER_METER = DeviceProfile(
+    type=PulsarType.pulsar_m_water.value,
+    model="Pulsar-M water meter",
+    value_format="I",
+    numbered_channel=_water_channel,
+    parameters=(1, 6, 10, 11),
+    archive=True,
+    flow_rate=True,
+    leak_detection=True
+)
+
+# channels 3 to 9 of the heat meter protocol
+HEAT_METER = DeviceProfile(
+    type="pulsar-heat-meter",
+    model="Pulsar heat meter",
+    value_format="f",
+    channels=(
+        ChannelSpec(3, SensorEntityDescription(
+            key=DATA_KEY_SUPPLY_TEMPERATURE,
+            name="Supply temperature",
+            translation_key=DATA_KEY_SUPPLY_TEMPERATURE,
+            device_class=SensorDeviceClass.TEMPERATURE,
+            state_class=SensorStateClass.MEASUREMENT,
+            native_unit_of_measurement=UnitOfTemperature.CELSIUS,
+            has_entity_name=True
+        )),
+        ChannelSpec(4, SensorEntityDescription(
+            key=DATA_KEY_RETURN_TEMPERATURE,
+            name="Return temperature",
+            translation_key=DATA_KEY_RETURN_TEMPERATURE,
+            device_class=SensorDeviceClass.TEMPERATURE,
+            state_class=SensorStateClass.MEASUREMENT,
+            native_unit_of_measurement=UnitOfTemperature.CELSIUS,
+            has_entity_name=True
+        )),
+        # a difference, no device class so it is not converted as a temperature
+        ChannelSpec(5, SensorEntityDescription(
+            key=DATA_KEY_TEMPERATURE_DIFFERENCE,
+            name="Temperature difference",
+            translation_key=DATA_KEY_TEMPERATURE_DIFFERENCE,
+            state_class=SensorStateClass.MEASUREMENT,
+            native_unit_of_measurement=UnitOfTemperature.KELVIN,
+            has_entity_name=True
+        )),
+        ChannelSpec(6, SensorEntityDescription(
+            key=DATA_KEY_HEAT_POWER,
+            name="Heat power",
+            translation_key=DATA_KEY_HEAT_POWER,
+            device_class=SensorDeviceClass.POWER,
+            state_class=SensorStateClass.MEASUREMENT,
+            native_unit_of_measurement=UnitOfPower.KILO_WATT,
+            has_entity_name=True
+        ), GCAL_PER_HOUR_TO_KW),
+        ChannelSpec(7, SensorEntityDescription(
+            key=DATA_KEY_HEAT_ENERGY,
+            name="Heat energy",
+            translation_key=DATA_KEY_HEAT_ENERGY,
+            device_class=SensorDeviceClass.ENERGY,
+            state_class=SensorStateClass.TOTAL_INCREASING,
+            native_unit_of_measurement=UnitOfEnergy.GIGA_JOULE,
+            has_entity_name=True
+        ), GCAL_TO_GJ),
+        ChannelSpec(8, SensorEntityDescription(
+            key=DATA_KEY_HEAT_VOLUME,
+            name="Heat carrier volume",
+            translation_key=DATA_KEY_HEAT_VOLUME,
+            device_class=SensorDeviceClass.WATER,
+            state_class=SensorStateClass.TOTAL_INCREASING,
+            native_unit_of_measurement=UnitOfVolume.CUBIC_METERS,
+            has_entity_name=True
+        )),
+        ChannelSpec(9, SensorEntityDescription(
+            key=DATA_KEY_HEAT_FLOW,
+            name="Heat carrier flow",
+            translation_key=DATA_KEY_HEAT_FLOW,
+            device_class=SensorDeviceClass.VOLUME_FLOW_RATE,
+            state_class=SensorStateClass.MEASUREMENT,
+            native_unit_of_measurement=UnitOfVolumeFlowRate.CUBIC_METERS_PER_HOUR,
+            has_entity_name=True
+        )),
+    )
+)
+
+PULSE_COUNTER = DeviceProfile(
+    type="pulsar-pulse-counter",
+    model="Pulsar pulse counter",
+    value_format="d",
+    numbered_channel=_pulse_channel
+)
+
+PROFILES: dict[str, DeviceProfile] = {
+    profile.type: profile for profile in (WATER_METER, HEAT_METER, PULSE_COUNTER)
+}
@@ -1,23 +1,46 @@
-"""Represent Pulsar Water M"""
+"""Represent Pulsar-M meters"""
 from __future__ import annotations
 
 import datetime
+from collections.abc import AsyncIterator
+import time
 from typing import Any
 from typing_extensions import override
 
-from .connector import Connector
+import homeassistant.util.dt as dt_util
+
+from . import codec
+from .archive import (
+    ARCHIVE_HEADER_SIZE,
+    ARCHIVE_VALUE_SIZE,
+    MAX_ARCHIVE_RECORDS,
+    ArchiveType
+)
+from .flow import FlowRate
+from .leak import LeakDetector, LeakSettings
+from .parameters import (
+    PARAM_CODE_SIZE,
+    PARAM_VALUE_SIZE,
+    PARAMETERS_BY_CODE,
+    PARAMETERS_BY_KEY
+)
+from .profiles import WATER_METER, DeviceProfile, ReadPlan
 from .pulsardevice import PulsarDevice
+from .scheduler import BusScheduler, Priority
 
 from .const import (
     DATA_KEY_BATTERY_VOLTAGE,
-    DATA_KEY_CURRENT_WATER_CONSUMPTION_CH1,
-    DATA_KEY_SYSTEM_TIME,
+    DATA_KEY_DAYLIGHT_SAVING_TIME,
     DATA_KEY_DEVICE_TEMPERATURE,
-    PulsarType
+    DATA_KEY_DIAGNOSTIC_FLAGS,
+    DATA_KEY_SYSTEM_TIME,
+    DEFAULT_CHANNELS,
+    DEFAULT_FLOW_RATE_WINDOW
 )
 
 
 class PulsarM(PulsarDevice):
+    """Meter speaking the Pulsar-M protocol, its model is given by a profile"""
 
     FUNCTION_READ_CURRENT_WATER_CONSUMPTION_READING = b'\x01'
     FUNCTION_READ_ARCHIVE = b'\x06'
@@ -26,136 +49,250 @@ class PulsarM(PulsarDevice):
     FUNCTION_READ_PARAMETERS = b'\x0A'
     FUNCTION_WRITE_PARAMETERS = b'\x0B'
 
-    def __init__(self, connector: Connector, name: str, addr: int) -> None:
-        super().__init__(connector, PulsarType.pulsar_m_water.value, name, addr)
+    def __init__(
+            self,
+            bus: BusScheduler,
+            name: str,
+            addr: int,
+            channels: int = DEFAULT_CHANNELS,
+            profile: DeviceProfile = WATER_METER,
+            flow_rate_window: datetime.timedelta = DEFAULT_FLOW_RATE_WINDOW,
+            leak_settings: LeakSettings = LeakSettings()) -> None:
+        super().__init__(bus, profile.type, name, addr)
+        self._profile = profile
+        self._channels = channels
+        specs = profile.channel_specs(channels)
+        self._channel_keys = {spec.description.key: spec.channel for spec in specs}
+        self._channel_scales = {spec.channel: spec.scale for spec in specs}
+        self._param_keys = {PARAMETERS_BY_CODE[code].key: code for code in profile.parameters}
+        # read plans by channel mask, the one of all channels is what every poll uses
+        self._plans: dict[frozenset[int], ReadPlan] = {}
+        self._read_plan(self._channel_keys.values())
+        self._flow_rates = {
+            spec.channel: FlowRate(flow_rate_window.total_seconds())
+            for spec in profile.flow_rate_specs(channels)
+        }
+        self._leak_detectors = {
+            spec.channel: LeakDetector(leak_settings)
+            for spec in profile.channel_specs(channels)
+        } if profile.leak_detection else {}
 
-    def read_current_water_consumption_reading(self) -> int:
-        payload_size = 4
-        response_payload_size = 4
+    @property
+    def channels(self) -> int:
+        return self._channels
 
-        mask_ch = 1
-        payload = bytearray(payload_size)
-        payload = self.write_hex(mask_ch, payload, payload_size, 0, False)
-        response_payload = self.send_payload(
-            payload,
+    @property
+    def profile(self) -> DeviceProfile:
+        return self._profile
+
+    @property
+    @override
+    def model(self) -> str:
+        return self._profile.model
+
+    def channel_key(self, channel: int) -> str | None:
+        """Data key of the reading of a channel"""
+        for key, ch in self._channel_keys.items():
+            if ch == channel:
+                return key
+        return None
+
+    def flow_rate(self, channel: int) -> float | None:
+        """Flow through a channel in counter units per second, from the readings taken so far"""
+        flow_rate = self._flow_rates.get(channel)
+        return None if flow_rate is None else flow_rate.rate(time.monotonic())
+
+    def leak_detector(self, channel: int) -> LeakDetector | None:
+        """Leak checks of a channel, up to date with the last reading"""
+        return self._leak_detectors.get(channel)
+
+    def _read_plan(self, channels) -> ReadPlan:
+        key = frozenset(channels)
+        plan = self._plans.get(key)
+        if plan is None:
+            plan = self._plans[key] = ReadPlan(
+                list(key), self._profile.value_format, self._channel_scales)
+        return plan
+
+    async def read_channels(self, channels: list[int]) -> dict[int, Any]:
+        """Read current values of several channels (numbered from 1) in one frame"""
+        plan = self._read_plan(channels)
+        response_payload = await self.send_payload(
+            plan.payload,
             self.FUNCTION_READ_CURRENT_WATER_CONSUMPTION_READING,
             self._addr,
             self.next_request_id(),
-            response_payload_size)
+            plan.response_size,
+            Priority.consumption)
+        values = plan.decode(response_payload)
+        if self._flow_rates or self._leak_detectors:
+            now = time.monotonic()
+            hour = dt_util.now().hour
+            for channel, value in values.items():
+                if channel in self._flow_rates:
+                    self._flow_rates[channel].add(now, value)
+                if channel in self._leak_detectors:
+                    self._leak_detectors[channel].add(now, hour, value)
+        return values
 
-        result = self.read_int_from_hex(
-            response_payload, payload_size, 0, False)
-        return result
+    async def read_current_water_consumption_reading(self, channel: int = 1) -> int:
+        result = await self.read_channels([channel])
+        return result[channel]
 
-    def read_sys_time(self) -> datetime:
+    async def read_sys_time(self) -> datetime:
         payload_size = 0
         response_payload_size = 6
         payload = bytes(payload_size)
 
-        response_payload = self.send_payload(
+        response_payload = await self.send_payload(
             payload,
             self.FUNCTION_READ_SYSTEM_TIME,
             self._addr,
             self.next_request_id(),
             response_payload_size)
 
-        year_byte = response_payload[0]
-        month_byte = response_payload[1]
-        day_byte = response_payload[2]
-        hour_byte = response_payload[3]
-        minute_byte = response_payload[4]
-        seconds_byte = response_payload[5]
-
-        result = datetime.datetime(
-            2000 + year_byte,
-            month_byte,
-            day_byte,
-            hour_byte,
-            minute_byte,
-            seconds_byte)
+        result = codec.read_datetime(response_payload, 0)
 
         return result
 
-    def read_diag_params(self):
-        payload_size = 2
-        response_payload_size = 8
+    async def read_parameters(self, codes: list[int]) -> dict[int, Any]:
+        """Read several parameters, each one in its own frame
 
-        param_code = 6
-        payload = bytearray(payload_size)
-        payload = self.write_hex(param_code, payload, payload_size, 0, False)
-        response_payload = self.send_payload(
-            payload,
-            self.FUNCTION_READ_PARAMETERS,
-            self._addr,
-            self.next_request_id(),
-            response_payload_size)
+        Function 0x0A carries a single parameter code, so this is one
+        transaction per distinct code. The value of a parameter that could
+        not be read is the exception raised for it.
+        """
+        payload = bytearray(PARAM_CODE_SIZE)
+        result: dict[int, Any] = {}
+        for code in dict.fromkeys(codes):
+            param = PARAMETERS_BY_CODE.get(code)
+            if param is None:
+                raise Exception(f"unknown parameter {code}")
+            self.write_hex(code, payload, PARAM_CODE_SIZE, 0, False)
+            try:
+                response_payload = await self.send_payload(
+                    payload,
+                    self.FUNCTION_READ_PARAMETERS,
+                    self._addr,
+                    self.next_request_id(),
+                    PARAM_VALUE_SIZE)
+                result[code] = param.decode(response_payload)
+            except Exception as ex:
+                result[code] = ex
+        return result
 
-        param_val = bin(response_payload[0])
+    async def read_parameter(self, code: int) -> Any:
+        value = (await self.read_parameters([code]))[code]
+        if isinstance(value, Exception):
+            raise value
+        return value
 
-        return param_val
+    async def read_diag_params(self) -> str:
+        return bin(await self.read_parameter(PARAMETERS_BY_KEY[DATA_KEY_DIAGNOSTIC_FLAGS].code))
 
-    def read_batt_voltage(self) -> float:
-        payload_size = 2
-        response_payload_size = 8
+    async def read_batt_voltage(self) -> float:
+        return await self.read_parameter(PARAMETERS_BY_KEY[DATA_KEY_BATTERY_VOLTAGE].code)
 
-        param_code = 10  # \x000A
-        payload = bytearray(payload_size)
-        payload = self.write_hex(param_code, payload, payload_size, 0, False)
-        response_payload = self.send_payload(
-            payload,
-            self.FUNCTION_READ_PARAMETERS,
-            self._addr,
-            self.next_request_id(),
-            response_payload_size)
-
-        param_val = self.read_float_from_hex(response_payload, 4, 0, False)
-        return param_val
+    async def read_temp(self) -> float:
+        return await self.read_parameter(PARAMETERS_BY_KEY[DATA_KEY_DEVICE_TEMPERATURE].code)
 
-    def read_temp(self) -> float:
-        payload_size = 2
-        response_payload_size = 8
+    async def read_daylight_saving_time(self) -> bool:
+        """Read the sign of automatic transition to daylight saving time"""
+        return await self.read_parameter(PARAMETERS_BY_KEY[DATA_KEY_DAYLIGHT_SAVING_TIME].code)
 
-        param_code = 11  # \x000B
-        payload = bytearray(payload_size)
-        payload = self.write_hex(param_code, payload, payload_size, 0, False)
-        response_payload = self.send_payload(
-            payload,
-            self.FUNCTION_READ_PARAMETERS,
-            self._addr,
-            self.next_request_id(),
-            response_payload_size)
+    async def read_archive(
+            self,
+            channel: int,
+            archive_type: ArchiveType,
+            start: datetime.datetime,
+            records: int) -> list[tuple[datetime.datetime, int]]:
+        """Read up to MAX_ARCHIVE_RECORDS archive records of a channel in one frame
 
-        param_val = self.read_float_from_hex(response_payload, 4, 0, False)
-        return param_val
+        Times are the meter local times of the records.
+        """
+        if not 1 <= records <= MAX_ARCHIVE_RECORDS:
+            raise Exception("wrong number of archive records")
 
-    def read_daylight_saving_time(self) -> bool:
-        """Read the sign of automatic transition to daylight saving time"""
-        payload_size = 2
-        response_payload_size = 8
+        start = archive_type.floor(start)
+        end = archive_type.advance(start, records - 1)
 
-        param_code = 1  # \x0001
+        # channel mask, archive type, time of the first and the last record
+        payload_size = 18
         payload = bytearray(payload_size)
-        payload = self.write_hex(param_code, payload, payload_size, 0, False)
-        response_payload = self.send_payload(
+        self.write_hex(1 << (channel - 1), payload, 4, 0, False)
+        self.write_hex(archive_type.value, payload, 2, 4, False)
+        codec.write_datetime(start, payload, 6)
+        codec.write_datetime(end, payload, 12)
+
+        response_payload = await self.send_payload(
             payload,
-            self.FUNCTION_READ_PARAMETERS,
+            self.FUNCTION_READ_ARCHIVE,
             self._addr,
             self.next_request_id(),
-            response_payload_size)
+            ARCHIVE_HEADER_SIZE + records * ARCHIVE_VALUE_SIZE,
+            Priority.background)
+
+        first = codec.read_datetime(response_payload, 6)
+        values = codec.read_uint32_array(
+            response_payload, records, ARCHIVE_HEADER_SIZE)
+        return [(archive_type.advance(first, i), value) for i, value in enumerate(values)]
 
-        param_val = bool(response_payload[0])
-        return param_val
+    async def read_archive_range(
+            self,
+            channel: int,
+            archive_type: ArchiveType,
+            start: datetime.datetime,
+            end: datetime.datetime) -> AsyncIterator[list[tuple[datetime.datetime, int]]]:
+        """Read archive records from start to end, yielding one batch per frame"""
+        start = archive_type.floor(start)
+        remaining = archive_type.count(start, archive_type.floor(end))
+        while remaining > 0:
+            records = min(remaining, MAX_ARCHIVE_RECORDS)
+            yield await self.read_archive(channel, archive_type, start, records)
+            start = archive_type.advance(start, records)
+            remaining -= records
 
     @override
-    def getdata(self, key: str) -> Any:
+    async def getdata(self, key: str) -> Any:
 
-        if key == DATA_KEY_CURRENT_WATER_CONSUMPTION_CH1:
-            return self.read_current_water_consumption_reading()
+        if key in self._channel_keys:
+            channel = self._channel_keys[key]
+            return (await self.read_channels([channel]))[channel]
+        elif key in self._param_keys:
+            return await self.read_parameter(self._param_keys[key])
         elif key == DATA_KEY_SYSTEM_TIME:
-            return self.read_sys_time()
-        elif key == DATA_KEY_DEVICE_TEMPERATURE:
-            return self.read_temp()
-        elif key == DATA_KEY_BATTERY_VOLTAGE:
-            return self.read_batt_voltage()
+            return await self.read_sys_time()
 
         return None
+
+    @override
+    async def getdata_many(self, keys: list[str]) -> dict[str, Any]:
+        """Reads all requested channels in one frame, then the parameters, other keys one by one"""
+        channel_keys = [key for key in keys if key in self._channel_keys]
+        param_keys = [key for key in keys if key in self._param_keys]
+        other_keys = [
+            key for key in keys
+            if key not in self._channel_keys and key not in self._param_keys]
+
+        result: dict[str, Any] = {}
+
+        # consumption goes first, it is what the other keys must not delay
+        if channel_keys:
+            try:
+                values = await self.read_channels(
+                    [self._channel_keys[key] for key in channel_keys])
+                for key in channel_keys:
+                    result[key] = values[self._channel_keys[key]]
+            except Exception as ex:
+                for key in channel_keys:
+                    result[key] = ex
+
+        if param_keys:
+            values = await self.read_parameters(
+                [self._param_keys[key] for key in param_keys])
+            for key in param_keys:
+                result[key] = values[self._param_keys[key]]
+
+        result.update(await super().getdata_many(other_keys))
+
+        return result
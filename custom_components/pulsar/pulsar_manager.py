@@ -1,46 +1,81 @@
 """Represent manager of devices"""
 
+from datetime import timedelta
 from typing import Any, List
 
 from .const import (
+    CONF_CHANNELS,
     CONF_DEVICE_CONFIG,
     CONF_DEVICE_OR_ADDRESS,
+    CONF_FLOW_RATE_WINDOW,
     CONF_NAME,
     CONF_SERIAL_ID,
-    CONF_TYPE
+    CONF_TYPE,
+    DEFAULT_CHANNELS,
+    DEFAULT_FLOW_RATE_WINDOW
 )
 
+from .leak import leak_settings
+from .profiles import PROFILES
 from .pulsar_m_water import PulsarM
 
-from .connector import Connector
 from .pulsardevice import PulsarDevice
+from .registry import SharedConnection
+from .scheduler import BusScheduler
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 
 
 class PulsarManager():
 
-    def __init__(self, hass: HomeAssistant, config_entry: ConfigEntry) -> None:
+    def __init__(self, hass: HomeAssistant, config_entry: ConfigEntry, connection: SharedConnection) -> None:
         self._hass = hass
         self.config_entry = config_entry
         self._devices: dict[str, dict[str, Any]] = {}
 
         device_or_ipaddress: str = config_entry.data[CONF_DEVICE_OR_ADDRESS]
 
-        self._connector = Connector(device_or_ipaddress, "connector")
+        self._device_or_address = device_or_ipaddress
+        self._connection = connection
+        self._bus = connection.bus
 
         device_confs: dict[str, dict[str, Any]
                            ] = config_entry.data[CONF_DEVICE_CONFIG]
+        flow_rate_window = timedelta(minutes=config_entry.options.get(
+            CONF_FLOW_RATE_WINDOW, DEFAULT_FLOW_RATE_WINDOW.total_seconds() / 60))
+        leak_thresholds = leak_settings(config_entry.options)
 
         for dev_id in device_confs:
             device_conf = device_confs[dev_id]
-            device_type = device_conf[CONF_TYPE]
-            if device_type == "pulsar-m-water":
+            profile = PROFILES.get(device_conf[CONF_TYPE])
+            if profile is not None:
                 device = PulsarM(
-                    self._connector, device_conf[CONF_NAME], device_conf[CONF_SERIAL_ID])
+                    self._bus,
+                    device_conf[CONF_NAME],
+                    device_conf[CONF_SERIAL_ID],
+                    device_conf.get(CONF_CHANNELS, DEFAULT_CHANNELS),
+                    profile,
+                    flow_rate_window,
+                    leak_thresholds)
                 self.add_device(dev_id, device)
 
+    @property
+    def device_or_address(self) -> str:
+        return self._device_or_address
+
+    @property
+    def bus(self) -> BusScheduler:
+        return self._bus
+
+    @property
+    def connection(self) -> SharedConnection:
+        return self._connection
+
+    @callback
+    def async_save_timeouts(self) -> None:
+        self._connection.async_save_timeouts()
+
     def get_device(self, device_id: str) -> PulsarDevice:
         device = self._devices.get(device_id, None)
         return device
@@ -0,0 +1,88 @@
+"""Registry of connections shared by config entries and flows"""
+from __future__ import annotations
+
+import asyncio
+import logging
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+from homeassistant.util import slugify
+
+from .connector import AsyncConnector, normalize_address
+from .const import (
+    DATA_PULSAR_REGISTRY,
+    DOMAIN
+)
+from .scheduler import BusScheduler
+
+_LOGGER = logging.getLogger(__name__)
+
+TIMEOUTS_STORAGE_VERSION = 1
+TIMEOUTS_SAVE_DELAY = 300
+
+
+class SharedConnection():
+    """Connector of a port with the scheduler of its bus and its learned timeouts"""
+
+    def __init__(self, hass: HomeAssistant, key: str, device_or_address: str) -> None:
+        self.key = key
+        self.connector = AsyncConnector(device_or_address, "connector")
+        self.bus = BusScheduler(self.connector)
+        self.refs = 0
+        self._timeouts_store = Store(
+            hass, TIMEOUTS_STORAGE_VERSION, f"{DOMAIN}.{slugify(key)}.timeouts")
+
+    async def async_restore_timeouts(self) -> None:
+        """Restores the round-trip profile learned on this port before restart"""
+        if (data := await self._timeouts_store.async_load()) is not None:
+            self.connector.timeouts.restore(data)
+
+    @callback
+    def async_save_timeouts(self) -> None:
+        self._timeouts_store.async_delay_save(
+            self.connector.timeouts.as_dict, TIMEOUTS_SAVE_DELAY)
+
+    async def async_close(self) -> None:
+        await self.bus.async_stop()
+        await self._timeouts_store.async_save(self.connector.timeouts.as_dict())
+        self.connector.disconnect()
+
+
+class ConnectorRegistry():
+    """Opens every port once, however many entries and flows use it
+
+    Connections are keyed by the normalized port or gateway address and
+    reference counted; the last user to release a connection closes it.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self._hass = hass
+        self._connections: dict[str, SharedConnection] = {}
+        self._lock = asyncio.Lock()
+
+    async def async_acquire(self, device_or_address: str) -> SharedConnection:
+        key = normalize_address(device_or_address)
+        async with self._lock:
+            connection = self._connections.get(key)
+            if connection is None:
+                connection = SharedConnection(self._hass, key, device_or_address)
+                await connection.async_restore_timeouts()
+                self._connections[key] = connection
+            connection.refs += 1
+            return connection
+
+    async def async_release(self, connection: SharedConnection) -> None:
+        async with self._lock:
+            connection.refs -= 1
+            if connection.refs > 0:
+                return
+            if self._connections.get(connection.key) is connection:
+                del self._connections[connection.key]
+            await connection.async_close()
+
+
+@callback
+def async_get_registry(hass: HomeAssistant) -> ConnectorRegistry:
+    if (registry := hass.data.get(DATA_PULSAR_REGISTRY)) is None:
+        registry = hass.data[DATA_PULSAR_REGISTRY] = ConnectorRegistry(hass)
+    return registry
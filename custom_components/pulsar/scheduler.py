@@ -0,0 +1,222 @@
+"""Scheduling of transactions on a shared RS-485 bus"""
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from dataclasses import dataclass, field
+import enum
+import logging
+
+from .connector import AsyncConnector
+from .const import DEFAULT_SCAN_INTERVAL
+from .metrics import BusMetrics
+
+_LOGGER = logging.getLogger(__name__)
+
+# transactions a single device may have waiting before callers are held back
+DEFAULT_MAX_PENDING = 16
+
+
+class Priority(enum.IntEnum):
+    """Priority of a bus transaction, lower goes first"""
+
+    consumption = 0
+    diagnostic = 1
+    background = 2
+
+
+# how long a transaction may wait in the queue before it is dropped
+PRIORITY_DEADLINES: dict[Priority, float | None] = {
+    Priority.consumption: DEFAULT_SCAN_INTERVAL.total_seconds(),
+    Priority.diagnostic: DEFAULT_SCAN_INTERVAL.total_seconds(),
+    Priority.background: None,
+}
+
+
+@dataclass
+class Transaction:
+    """Request waiting for the bus"""
+
+    addr: int
+    message: bytes
+    deadline: float | None
+    future: asyncio.Future = field(repr=False)
+    # caps the reply timeout learned for the device
+    reply_timeout: float | None = None
+
+
+class _PriorityLevel():
+    """Per-device FIFO queues of one priority, served round robin"""
+
+    def __init__(self) -> None:
+        self.queues: dict[int, deque[Transaction]] = {}
+        self.turns: deque[int] = deque()
+
+    def push(self, transaction: Transaction) -> None:
+        queue = self.queues.get(transaction.addr)
+        if queue is None:
+            queue = self.queues[transaction.addr] = deque()
+            self.turns.append(transaction.addr)
+        queue.append(transaction)
+
+    def pop(self) -> Transaction | None:
+        while self.turns:
+            addr = self.turns.popleft()
+            queue = self.queues[addr]
+            transaction = queue.popleft()
+            if queue:
+                # the device goes to the back of the line
+                self.turns.append(addr)
+            else:
+                del self.queues[addr]
+            return transaction
+        return None
+
+
+class BusScheduler():
+    """Owns the line of a connector and decides which transaction goes next
+
+    Transactions are served by priority. Within a priority every device gets
+    one transaction in turn, so a device with many queued requests (or a slow
+    one) cannot hold the others back. An archive download runs at background
+    priority one frame at a time, so consumption reads slip in between its
+    frames. Transactions that waited past their deadline are dropped without
+    touching the bus, and a device with too many pending transactions makes
+    its callers wait for room.
+    """
+
+    def __init__(self, connector: AsyncConnector, max_pending: int = DEFAULT_MAX_PENDING) -> None:
+        self._connector = connector
+        self._max_pending = max_pending
+        self._levels = {priority: _PriorityLevel() for priority in Priority}
+        self._pending: dict[int, int] = {}
+        self._room = asyncio.Condition()
+        self._wakeup = asyncio.Event()
+        self._worker: asyncio.Task | None = None
+
+    @property
+    def connector(self) -> AsyncConnector:
+        return self._connector
+
+    @property
+    def metrics(self) -> BusMetrics:
+        return self._connector.metrics
+
+    def pending(self, addr: int | None = None) -> int:
+        """Returns the number of queued transactions, of one device or in total"""
+        if addr is None:
+            return sum(self._pending.values())
+        return self._pending.get(addr, 0)
+
+    async def request(
+            self,
+            addr: int,
+            message: bytes,
+            priority: Priority = Priority.diagnostic,
+            timeout: float | None = None,
+            reply_timeout: float | None = None) -> bytearray:
+        """Queues a transaction and returns the response once it went over the bus
+
+        timeout is how long the transaction may wait for the bus, the default
+        depends on the priority. reply_timeout caps how long the device is
+        waited for once the request is sent.
+        """
+        loop = asyncio.get_running_loop()
+        if timeout is None:
+            timeout = PRIORITY_DEADLINES[priority]
+        deadline = None if timeout is None else loop.time() + timeout
+
+        await self._async_wait_for_room(addr, deadline)
+
+        transaction = Transaction(
+            addr, message, deadline, loop.create_future(), reply_timeout)
+        self._levels[priority].push(transaction)
+        self._pending[addr] = self._pending.get(addr, 0) + 1
+        self._wakeup.set()
+
+        if self._worker is None or self._worker.done():
+            self._worker = loop.create_task(
+                self._async_run(), name=f"pulsar bus {self._connector.name()}")
+
+        return await transaction.future
+
+    async def _async_wait_for_room(self, addr: int, deadline: float | None) -> None:
+        if self._pending.get(addr, 0) < self._max_pending:
+            return
+        timeout = None
+        if deadline is not None:
+            timeout = max(0, deadline - asyncio.get_running_loop().time())
+        async with self._room:
+            try:
+                await asyncio.wait_for(
+                    self._room.wait_for(
+                        lambda: self._pending.get(addr, 0) < self._max_pending),
+                    timeout)
+            except asyncio.TimeoutError as ex:
+                raise Exception("bus queue is full") from ex
+
+    def _next_transaction(self) -> Transaction | None:
+        for priority in Priority:
+            transaction = self._levels[priority].pop()
+            if transaction is not None:
+                return transaction
+        return None
+
+    async def _async_run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            transaction = self._next_transaction()
+            if transaction is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            try:
+                if transaction.future.done():
+                    # caller went away
+                    continue
+                if transaction.deadline is not None and transaction.deadline < loop.time():
+                    transaction.future.set_exception(
+                        Exception("deadline passed before the bus was free"))
+                    continue
+                try:
+                    response = await self._connector.send(
+                        transaction.message, transaction.deadline,
+                        transaction.reply_timeout)
+                except asyncio.CancelledError:
+                    if not transaction.future.done():
+                        transaction.future.set_exception(
+                            Exception("bus is stopped"))
+                    raise
+                except Exception as ex:
+                    if not transaction.future.done():
+                        transaction.future.set_exception(ex)
+                else:
+                    if not transaction.future.done():
+                        transaction.future.set_result(response)
+            finally:
+                await self._async_release(transaction.addr)
+
+    async def _async_release(self, addr: int) -> None:
+        pending = self._pending[addr] - 1
+        if pending:
+            self._pending[addr] = pending
+        else:
+            del self._pending[addr]
+        async with self._room:
+            self._room.notify_all()
+
+    async def async_stop(self) -> None:
+        """Stops the worker and fails every queued transaction"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        while (transaction := self._next_transaction()) is not None:
+            if not transaction.future.done():
+                transaction.future.set_exception(Exception("bus is stopped"))
+        self._pending.clear()
@@ -1,77 +1,214 @@
 """Support for Pulsar devices."""
 from __future__ import annotations
 
+from collections.abc import Callable
 from dataclasses import dataclass
+import datetime
+import time
+from typing import Any
 
 from homeassistant.components.sensor import (
+    RestoreSensor,
     SensorDeviceClass,
     SensorEntity,
     SensorEntityDescription,
+    SensorExtraStoredData,
     SensorStateClass,
 )
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import (
-    UnitOfTemperature,
-    UnitOfVolume,
+    PERCENTAGE,
+    EntityCategory,
+    UnitOfInformation,
+    UnitOfTime,
 )
 from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import entity
 from homeassistant.helpers.dispatcher import async_dispatcher_connect
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
 from homeassistant.helpers.typing import StateType
+import homeassistant.util.dt as dt_util
 
 from . import HomeAssistantPulsarData
 
 from .const import (
-    DATA_KEY_CURRENT_WATER_CONSUMPTION_CH1,
-    DATA_KEY_SYSTEM_TIME,
-    DATA_KEY_DEVICE_TEMPERATURE,
-    DEFAULT_SCAN_INTERVAL,
+    CONF_FORCE_UPDATE_INTERVAL,
+    DEFAULT_FORCE_UPDATE_INTERVAL,
     DOMAIN,
     PULSAR_DISCOVERY_NEW
 )
 
+from .cache import CachedReading, ReadingQuality
+from .coordinator import PulsarDataUpdateCoordinator
+from .filters import Deadband, PublishFilter, sensor_deadband
+from .metrics import BusMetrics, LinkCounters
+from .pulsar_m_water import PulsarM
 from .pulsardevice import PulsarDevice
 
 from .entity import BasePulsarEntity
 
-SCAN_INTERVAL = DEFAULT_SCAN_INTERVAL
+
+@dataclass
+class PulsarSensorExtraStoredData(SensorExtraStoredData):
+    """Last reading of a sensor, kept over restarts."""
+
+    timestamp: datetime.datetime | None = None
+    quality: str | None = None
+
+    def as_dict(self) -> dict[str, Any]:
+        data = super().as_dict()
+        data["timestamp"] = None if self.timestamp is None else self.timestamp.isoformat()
+        data["quality"] = self.quality
+        return data
+
+    @classmethod
+    def from_dict(cls, restored: dict[str, Any]) -> PulsarSensorExtraStoredData | None:
+        extra = super().from_dict(restored)
+        if extra is None:
+            return None
+        timestamp = restored.get("timestamp")
+        extra.timestamp = None if timestamp is None else dt_util.parse_datetime(timestamp)
+        extra.quality = restored.get("quality")
+        return extra
 
 
 @dataclass
-class PulsarSensorEntityDescription(SensorEntityDescription):
-    """Describes Pulsar sensor entity."""
-
-    subkey: str | None = None
-
-
-SENSORS: dict[str, tuple[PulsarSensorEntityDescription, ...]] = {
-    "pulsar-m-water": (
-        PulsarSensorEntityDescription(
-            key=DATA_KEY_CURRENT_WATER_CONSUMPTION_CH1,
-            name="Current water consumption",
-            translation_key=DATA_KEY_CURRENT_WATER_CONSUMPTION_CH1,
-            device_class=SensorDeviceClass.WATER,
-            state_class=SensorStateClass.TOTAL_INCREASING,
-            native_unit_of_measurement=UnitOfVolume.LITERS,
-            has_entity_name=True
-        ),
-        PulsarSensorEntityDescription(
-            key=DATA_KEY_SYSTEM_TIME,
-            name="System time",
-            translation_key=DATA_KEY_SYSTEM_TIME,
-            has_entity_name=True
-        ),
-        PulsarSensorEntityDescription(
-            key=DATA_KEY_DEVICE_TEMPERATURE,
-            name="Temperature of meter",
-            translation_key=DATA_KEY_DEVICE_TEMPERATURE,
-            device_class=SensorDeviceClass.TEMPERATURE,
-            state_class=SensorStateClass.MEASUREMENT,
-            native_unit_of_measurement=UnitOfTemperature.CELSIUS,
-            has_entity_name=True
-        )
-    )
-}
+class PulsarMetricSensorEntityDescription(SensorEntityDescription):
+    """Describes a sensor of bus traffic counters."""
+
+    value_fn: Callable[[Any], StateType] = lambda counters: None
+    attributes_fn: Callable[[Any], dict[str, Any]] | None = None
+
+
+def _error_attributes(counters: LinkCounters) -> dict[str, Any]:
+    return {
+        "timeouts": counters.timeouts,
+        "truncated": counters.truncated,
+        "crc_errors": counters.crc_errors,
+        "length_errors": counters.length_errors,
+        "address_mismatches": counters.address_mismatches,
+        "request_id_mismatches": counters.request_id_mismatches,
+        "device_errors": counters.device_errors,
+    }
+
+
+def _rtt_attributes(counters: LinkCounters) -> dict[str, Any]:
+    return {"p99": counters.rtt_ms(0.99)}
+
+
+# counters of the traffic with one meter
+METER_METRIC_SENSORS: tuple[PulsarMetricSensorEntityDescription, ...] = (
+    PulsarMetricSensorEntityDescription(
+        key="bus_errors",
+        name="Bus errors",
+        translation_key="bus_errors",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        has_entity_name=True,
+        value_fn=lambda counters: counters.errors,
+        attributes_fn=_error_attributes
+    ),
+    PulsarMetricSensorEntityDescription(
+        key="bus_transactions",
+        name="Bus transactions",
+        translation_key="bus_transactions",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+        has_entity_name=True,
+        value_fn=lambda counters: counters.transactions
+    ),
+    PulsarMetricSensorEntityDescription(
+        key="round_trip_time",
+        name="Round-trip time",
+        translation_key="round_trip_time",
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+        has_entity_name=True,
+        value_fn=lambda counters: counters.rtt_ms(0.5),
+        attributes_fn=_rtt_attributes
+    ),
+)
+
+# counters of the whole line
+BUS_METRIC_SENSORS: tuple[PulsarMetricSensorEntityDescription, ...] = (
+    PulsarMetricSensorEntityDescription(
+        key="bus_utilization",
+        name="Bus utilization",
+        translation_key="bus_utilization",
+        state_class=SensorStateClass.MEASUREMENT,
+        native_unit_of_measurement=PERCENTAGE,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        has_entity_name=True,
+        value_fn=lambda metrics: metrics.utilization()
+    ),
+    PulsarMetricSensorEntityDescription(
+        key="bus_transactions",
+        name="Bus transactions",
+        translation_key="bus_transactions",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        has_entity_name=True,
+        value_fn=lambda metrics: metrics.total.transactions
+    ),
+    PulsarMetricSensorEntityDescription(
+        key="bus_errors",
+        name="Bus errors",
+        translation_key="bus_errors",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        has_entity_name=True,
+        value_fn=lambda metrics: metrics.total.errors,
+        attributes_fn=lambda metrics: _error_attributes(metrics.total)
+    ),
+    PulsarMetricSensorEntityDescription(
+        key="bus_bytes_out",
+        name="Bytes sent",
+        translation_key="bus_bytes_out",
+        device_class=SensorDeviceClass.DATA_SIZE,
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        native_unit_of_measurement=UnitOfInformation.BYTES,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        has_entity_name=True,
+        value_fn=lambda metrics: metrics.total.bytes_out
+    ),
+    PulsarMetricSensorEntityDescription(
+        key="bus_bytes_in",
+        name="Bytes received",
+        translation_key="bus_bytes_in",
+        device_class=SensorDeviceClass.DATA_SIZE,
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        native_unit_of_measurement=UnitOfInformation.BYTES,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        has_entity_name=True,
+        value_fn=lambda metrics: metrics.total.bytes_in
+    ),
+    PulsarMetricSensorEntityDescription(
+        key="bus_reconnects",
+        name="Reconnects",
+        translation_key="bus_reconnects",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        has_entity_name=True,
+        value_fn=lambda metrics: metrics.reconnects
+    ),
+    PulsarMetricSensorEntityDescription(
+        key="round_trip_time",
+        name="Round-trip time",
+        translation_key="round_trip_time",
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        has_entity_name=True,
+        value_fn=lambda metrics: metrics.total.rtt_ms(0.5),
+        attributes_fn=lambda metrics: _rtt_attributes(metrics.total)
+    ),
+)
 
 
 async def async_setup_entry(
@@ -80,21 +217,54 @@ async def async_setup_entry(
     """Set up Pulsar sensor dynamically"""
     hass_data: HomeAssistantPulsarData = hass.data[DOMAIN][entry.entry_id]
 
+    async_add_entities(
+        PulsarBusMetricSensorEntity(hass_data.coordinator, entry, description)
+        for description in BUS_METRIC_SENSORS
+    )
+
+    force_update_interval = datetime.timedelta(minutes=entry.options.get(
+        CONF_FORCE_UPDATE_INTERVAL, DEFAULT_FORCE_UPDATE_INTERVAL.total_seconds() / 60))
+
     @callback
     def async_discover_device(device_ids: list[int]) -> None:
         """Discover and add a discovered Pulsar sensor."""
-        entities: list[PulsarSensorEntity] = []
+        entities: list[SensorEntity] = []
         for device_id in device_ids:
             device = hass_data.device_manager.get_device(device_id)
-            if descriptions := SENSORS.get(device._type):
-                for description in descriptions:
+            descriptions = ()
+            if isinstance(device, PulsarM):
+                descriptions = device.profile.sensor_descriptions(device.channels)
+            for description in descriptions:
+                entities.append(
+                    PulsarSensorEntity(
+                        hass_data.coordinator,
+                        device_id,
+                        device,
+                        description,
+                        force_update_interval,
+                        sensor_deadband(description, entry.options)
+                    )
+                )
+            if isinstance(device, PulsarM):
+                for spec in device.profile.flow_rate_specs(device.channels):
                     entities.append(
-                        PulsarSensorEntity(
+                        PulsarFlowRateSensorEntity(
+                            hass_data.coordinator,
                             device_id,
                             device,
-                            description
+                            spec.description,
+                            spec.channel
                         )
                     )
+            for description in METER_METRIC_SENSORS:
+                entities.append(
+                    PulsarMeterMetricSensorEntity(
+                        hass_data.coordinator,
+                        device_id,
+                        device,
+                        description
+                    )
+                )
 
         async_add_entities(entities)
 
@@ -106,30 +276,198 @@ async def async_setup_entry(
     )
 
 
-class PulsarSensorEntity(BasePulsarEntity, SensorEntity):
+class PulsarSensorEntity(BasePulsarEntity, RestoreSensor):
     """Pulsar Sensor Entity."""
 
     def __init__(
             self,
+            coordinator: PulsarDataUpdateCoordinator,
             unique_id: str,
             pulsar_device: PulsarDevice,
-            description: PulsarSensorEntityDescription) -> None:
-        super().__init__(unique_id, pulsar_device)
+            description: SensorEntityDescription,
+            force_update_interval: datetime.timedelta = DEFAULT_FORCE_UPDATE_INTERVAL,
+            deadband: Deadband = Deadband()) -> None:
+        super().__init__(coordinator, unique_id, pulsar_device, description.key)
 
         self.entity_description = description
+        self._force_update_interval = force_update_interval.total_seconds()
+        self._filter = PublishFilter(deadband)
         internal_unique_id = (
             f"{super().unique_id}.{description.key}"
         )
         self._attr_unique_id = internal_unique_id
         self.entity_id = internal_unique_id
 
+    @property
+    def available(self) -> bool:
+        """Return if the meter answers and a reading younger than its max age is cached."""
+        return super().available and self.pulsar_device.health.is_available and \
+            self.coordinator_reading(self.entity_description.key) is not None
+
+    async def async_added_to_hass(self) -> None:
+        """Show the last reading known before the restart until the meter is read."""
+        await self._async_restore_reading()
+        self._filter.update(self.coordinator_value(self.entity_description.key), time.monotonic())
+        await super().async_added_to_hass()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Pass the new reading through the deadband before it is compared and written."""
+        self._filter.update(self.coordinator_value(self.entity_description.key), time.monotonic())
+        super()._handle_coordinator_update()
+
+    async def _async_restore_reading(self) -> None:
+        last = await self.async_get_last_extra_data()
+        if last is None:
+            return
+        extra = PulsarSensorExtraStoredData.from_dict(last.as_dict())
+        if extra is None or extra.native_value is None or extra.timestamp is None:
+            return
+        try:
+            quality = ReadingQuality(extra.quality)
+        except ValueError:
+            quality = ReadingQuality.stale
+        self.pulsar_device.cache.restore(
+            self.entity_description.key,
+            CachedReading(extra.native_value, extra.timestamp, quality))
+
+    @property
+    def extra_restore_state_data(self) -> PulsarSensorExtraStoredData:
+        """Return the reading to keep over a restart."""
+        reading = self.coordinator_reading(self.entity_description.key)
+        return PulsarSensorExtraStoredData(
+            None if reading is None else reading.value,
+            self.native_unit_of_measurement,
+            None if reading is None else reading.timestamp,
+            None if reading is None else reading.quality.value)
+
     @property
     def native_value(self) -> StateType:
         """Return the value reported by the sensor."""
 
-        # Raw value
-        value = self._pulsar_device.getdata(self.entity_description.key)
-        if value is None:
+        # Cached value read by the coordinator, as it last passed the deadband
+        return self._filter.value
+
+
+class PulsarFlowRateSensorEntity(BasePulsarEntity, SensorEntity):
+    """Flow through a channel, derived from the readings of its counter.
+
+    Listens to the consumption reading of the channel, so it costs no
+    frames of its own and updates in the same cycle as the counter.
+    """
+
+    def __init__(
+            self,
+            coordinator: PulsarDataUpdateCoordinator,
+            unique_id: str,
+            pulsar_device: PulsarM,
+            description: SensorEntityDescription,
+            channel: int) -> None:
+        super().__init__(coordinator, unique_id, pulsar_device, pulsar_device.channel_key(channel))
+
+        self.entity_description = description
+        self._channel = channel
+        internal_unique_id = (
+            f"{super().unique_id}.{description.key}"
+        )
+        self._attr_unique_id = internal_unique_id
+        self.entity_id = internal_unique_id
+
+    def _liters_per_minute(self) -> float | None:
+        rate = self.pulsar_device.flow_rate(self._channel)
+        return None if rate is None else round(rate * 60, 3)
+
+    @property
+    def available(self) -> bool:
+        """Return if the meter answers and enough readings were taken for a rate."""
+        return super().available and self.pulsar_device.health.is_available and \
+            self._liters_per_minute() is not None
+
+    @property
+    def native_value(self) -> StateType:
+        return self._liters_per_minute()
+
+
+class PulsarMeterMetricSensorEntity(BasePulsarEntity, SensorEntity):
+    """Counters of the bus traffic with one meter."""
+
+    entity_description: PulsarMetricSensorEntityDescription
+
+    def __init__(
+            self,
+            coordinator: PulsarDataUpdateCoordinator,
+            unique_id: str,
+            pulsar_device: PulsarDevice,
+            description: PulsarMetricSensorEntityDescription) -> None:
+        # no data key, the counters are kept by the connector, not read from the meter
+        super().__init__(coordinator, unique_id, pulsar_device)
+
+        self.entity_description = description
+        internal_unique_id = (
+            f"{super().unique_id}.{description.key}"
+        )
+        self._attr_unique_id = internal_unique_id
+        self.entity_id = internal_unique_id
+
+    def _counters(self) -> LinkCounters:
+        counters = self.pulsar_device.bus.metrics.meters.get(self.pulsar_device.addr)
+        return LinkCounters() if counters is None else counters
+
+    @property
+    def available(self) -> bool:
+        """Counters matter most when the meter does not answer."""
+        return True
+
+    @property
+    def native_value(self) -> StateType:
+        return self.entity_description.value_fn(self._counters())
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any] | None:
+        if self.entity_description.attributes_fn is None:
             return None
+        return self.entity_description.attributes_fn(self._counters())
+
 
-        return value
+class PulsarBusMetricSensorEntity(CoordinatorEntity[PulsarDataUpdateCoordinator], SensorEntity):
+    """Counters of the traffic on the line of a config entry."""
+
+    entity_description: PulsarMetricSensorEntityDescription
+
+    def __init__(
+            self,
+            coordinator: PulsarDataUpdateCoordinator,
+            entry: ConfigEntry,
+            description: PulsarMetricSensorEntityDescription) -> None:
+        super().__init__(coordinator)
+
+        self.entity_description = description
+        self._metrics: BusMetrics = coordinator.device_manager.bus.metrics
+        self._bus_id = f"bus.{entry.entry_id}"
+        self._device_or_address = coordinator.device_manager.device_or_address
+        self._attr_unique_id = f"pulsar.{self._bus_id}.{description.key}"
+
+    @property
+    def device_info(self) -> entity.DeviceInfo:
+        """Return the line as a device, its meters are separate devices."""
+        return entity.DeviceInfo(
+            identifiers={(DOMAIN, self._bus_id)},
+            manufacturer="Pulsar",
+            model="RS-485 bus",
+            name=f"Pulsar bus {self._device_or_address}"
+        )
+
+    @property
+    def available(self) -> bool:
+        """Counters matter most when the bus does not answer."""
+        return True
+
+    @property
+    def native_value(self) -> StateType:
+        return self.entity_description.value_fn(self._metrics)
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any] | None:
+        if self.entity_description.attributes_fn is None:
+            return None
+        return self.entity_description.attributes_fn(self._metrics)
@@ -0,0 +1,169 @@
+"""Long-lived TCP sessions to serial-over-IP gateways"""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable
+import logging
+import random
+import socket
+
+_LOGGER = logging.getLogger(__name__)
+
+CONNECT_TIMEOUT = 3
+RECONNECT_MIN_DELAY = 0.5
+RECONNECT_MAX_DELAY = 60
+# keepalive probes after 10 s idle, every 5 s, dead after 3 missed
+KEEPALIVE_IDLE = 10
+KEEPALIVE_INTERVAL = 5
+KEEPALIVE_COUNT = 3
+# unacknowledged data older than this drops the connection (Linux only)
+USER_TIMEOUT_MS = 30000
+
+
+def configure_socket(sock) -> None:
+    """Disables Nagle and enables keepalive so half-open connections are detected"""
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    for option, value in (
+            ("TCP_KEEPIDLE", KEEPALIVE_IDLE),
+            ("TCP_KEEPINTVL", KEEPALIVE_INTERVAL),
+            ("TCP_KEEPCNT", KEEPALIVE_COUNT),
+            ("TCP_USER_TIMEOUT", USER_TIMEOUT_MS)):
+        if hasattr(socket, option):
+            sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+
+
+class _GatewayProtocol(asyncio.StreamReaderProtocol):
+    """Stream protocol that closes the connection when the gateway half-closes it"""
+
+    def eof_received(self) -> bool:
+        super().eof_received()
+        # a gateway never half-closes on purpose, closing lets the monitor
+        # see the connection end right away
+        return False
+
+
+class TcpSession():
+    """Connection to a gateway that is kept open and reopened in the background
+
+    When the gateway drops the connection (or keepalive finds it dead) the
+    session reconnects with exponential backoff and jitter, and requests
+    wait for the connection to come back instead of failing.
+    """
+
+    def __init__(
+            self,
+            host: str,
+            port: str,
+            on_connected: Callable[[], None] | None = None) -> None:
+        self._host = host
+        self._port = port
+        self._on_connected = on_connected
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._connected = asyncio.Event()
+        self._monitor: asyncio.Task | None = None
+        self._reconnect: asyncio.Task | None = None
+        self._closed = False
+
+    @property
+    def reader(self) -> asyncio.StreamReader | None:
+        return self._reader
+
+    @property
+    def writer(self) -> asyncio.StreamWriter | None:
+        return self._writer
+
+    @property
+    def is_connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing() \
+            and not self._reader.at_eof()
+
+    async def async_open(self) -> bool:
+        """Makes one connection attempt, returns True if the session is open"""
+        self._closed = False
+        self._drop_streams()
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+        protocol = _GatewayProtocol(reader)
+        try:
+            transport, _ = await asyncio.wait_for(
+                loop.create_connection(lambda: protocol, self._host, self._port),
+                CONNECT_TIMEOUT)
+        except (OSError, asyncio.TimeoutError) as ex:
+            _LOGGER.debug(f"Unable to connect to {self._host}:{self._port}: {ex}")
+            return False
+
+        writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            configure_socket(sock)
+
+        self._reader = reader
+        self._writer = writer
+        self._connected.set()
+        if self._on_connected is not None:
+            self._on_connected()
+        self._monitor = loop.create_task(
+            self._async_monitor(writer), name=f"pulsar tcp monitor {self._host}:{self._port}")
+        return True
+
+    async def _async_monitor(self, writer: asyncio.StreamWriter) -> None:
+        """Starts reconnecting as soon as the gateway closes the connection"""
+        try:
+            await writer.wait_closed()
+        except (OSError, asyncio.CancelledError):
+            pass
+        if self._writer is writer:
+            _LOGGER.info(f"Connection to {self._host}:{self._port} lost")
+            self.drop()
+
+    def drop(self) -> None:
+        """Closes a broken connection and reconnects in the background"""
+        self._drop_streams()
+        self.start_reconnect()
+
+    def start_reconnect(self) -> None:
+        if self._closed or self.is_connected:
+            return
+        if self._reconnect is None or self._reconnect.done():
+            self._reconnect = asyncio.get_running_loop().create_task(
+                self._async_reconnect(), name=f"pulsar tcp reconnect {self._host}:{self._port}")
+
+    async def _async_reconnect(self) -> None:
+        delay = RECONNECT_MIN_DELAY
+        while not self._closed:
+            if await self.async_open():
+                _LOGGER.info(f"Reconnected to {self._host}:{self._port}")
+                return
+            await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    async def async_wait_connected(self, timeout: float) -> bool:
+        """Waits for the session to be open, at most timeout seconds"""
+        if self.is_connected:
+            return True
+        self.start_reconnect()
+        try:
+            await asyncio.wait_for(self._connected.wait(), max(timeout, 0))
+        except asyncio.TimeoutError:
+            return False
+        return self.is_connected
+
+    def _drop_streams(self) -> None:
+        self._connected.clear()
+        writer = self._writer
+        self._reader = None
+        self._writer = None
+        if writer is not None:
+            writer.close()
+
+    def close(self) -> None:
+        """Closes the session for good"""
+        self._closed = True
+        for task in (self._reconnect, self._monitor):
+            if task is not None and not task.done():
+                task.cancel()
+        self._reconnect = None
+        self._monitor = None
+        self._drop_streams()
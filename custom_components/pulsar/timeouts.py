@@ -0,0 +1,144 @@
+"""Reply timeouts learned from the round-trip times of each device"""
+from __future__ import annotations
+
+import bisect
+from typing import Any
+
+# upper bounds of the histogram buckets, 5 ms to ~13 s in steps of 25%
+BUCKET_BOUNDS = tuple(0.005 * 1.25 ** i for i in range(36))
+
+# once a histogram holds this many samples, older ones count half
+MAX_SAMPLES = 1000
+MIN_SAMPLES = 5
+
+DEFAULT_PERCENTILE = 0.99
+DEFAULT_MARGIN_FACTOR = 1.5
+DEFAULT_MARGIN = 0.05
+DEFAULT_FLOOR = 0.1
+DEFAULT_CEILING = 10.0
+# after a timeout the next one is this much longer, up to MAX_BACKOFF times
+BACKOFF_FACTOR = 2
+MAX_BACKOFF = 4
+# a device without a histogram of its own is waited for up to the ceiling once
+# in this many requests it misses in a row, so a meter slower than the rest
+# of the bus is heard and learned from its own round trips
+LONG_PROBE_INTERVAL = 4
+
+
+class RttHistogram():
+    """Log-bucketed histogram of round-trip times in seconds"""
+
+    def __init__(self, counts: list[int] | None = None) -> None:
+        self._counts = [0] * len(BUCKET_BOUNDS)
+        if counts is not None:
+            for i, count in enumerate(counts[:len(BUCKET_BOUNDS)]):
+                self._counts[i] = int(count)
+        self._total = sum(self._counts)
+
+    @property
+    def total(self) -> int:
+        return self._total
+
+    @property
+    def counts(self) -> list[int]:
+        return list(self._counts)
+
+    def add(self, rtt: float) -> None:
+        index = min(bisect.bisect_left(BUCKET_BOUNDS, rtt), len(BUCKET_BOUNDS) - 1)
+        self._counts[index] += 1
+        self._total += 1
+        if self._total >= MAX_SAMPLES:
+            # decay, so the histogram follows a device whose timing drifts
+            self._counts = [count // 2 for count in self._counts]
+            self._total = sum(self._counts)
+
+    def percentile(self, fraction: float) -> float | None:
+        """Returns the upper bound of the bucket holding the fraction percentile"""
+        if self._total == 0:
+            return None
+        rank = fraction * self._total
+        cumulative = 0
+        for bound, count in zip(BUCKET_BOUNDS, self._counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return BUCKET_BOUNDS[-1]
+
+
+class AdaptiveTimeouts():
+    """Per-address reply timeouts from a high percentile of observed round trips
+
+    A device without enough samples of its own uses the histogram of the
+    whole bus, and only a bus without any history uses the initial timeout.
+    Every timeout in a row makes the next one longer, up to MAX_BACKOFF
+    times, so a missing meter costs a few learned timeouts rather than the
+    initial one and the circuit breaker of the device takes it from there.
+    The bus histogram may come from faster models, so a device without a
+    histogram of its own is waited for up to the ceiling on every
+    LONG_PROBE_INTERVAL-th request in a row it misses, and once it has answered its
+    own round trips raise its timeout.
+    """
+
+    def __init__(
+            self,
+            initial: float,
+            floor: float = DEFAULT_FLOOR,
+            ceiling: float = DEFAULT_CEILING,
+            percentile: float = DEFAULT_PERCENTILE) -> None:
+        self._initial = initial
+        self._floor = floor
+        self._ceiling = ceiling
+        self._percentile = percentile
+        self._devices: dict[int, RttHistogram] = {}
+        self._bus = RttHistogram()
+        # consecutive timeouts of each device
+        self._misses: dict[int, int] = {}
+
+    def _learned(self, histogram: RttHistogram) -> float:
+        return histogram.percentile(self._percentile) * DEFAULT_MARGIN_FACTOR + DEFAULT_MARGIN
+
+    def timeout(self, addr: int) -> float:
+        own = self._devices.get(addr)
+        misses = self._misses.get(addr, 0)
+        if own is None or own.total < MIN_SAMPLES:
+            if (misses + 1) % LONG_PROBE_INTERVAL == 0:
+                return self._ceiling
+            if self._bus.total < MIN_SAMPLES:
+                timeout = self._initial
+            else:
+                timeout = self._learned(self._bus) * min(BACKOFF_FACTOR ** misses, MAX_BACKOFF)
+            if own is not None and own.total:
+                # the few answers of a device slower than the bus
+                timeout = max(timeout, self._learned(own))
+        else:
+            timeout = self._learned(own) * min(BACKOFF_FACTOR ** misses, MAX_BACKOFF)
+        return min(max(timeout, self._floor), self._ceiling)
+
+    def record(self, addr: int, rtt: float) -> None:
+        """Records the round trip of a reply"""
+        histogram = self._devices.get(addr)
+        if histogram is None:
+            histogram = self._devices[addr] = RttHistogram()
+        histogram.add(rtt)
+        self._bus.add(rtt)
+        self._misses.pop(addr, None)
+
+    def record_timeout(self, addr: int) -> None:
+        """Gives a device that did not answer in time longer on the next request"""
+        self._misses[addr] = self._misses.get(addr, 0) + 1
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "devices": {
+                str(addr): histogram.counts for addr, histogram in self._devices.items()
+            },
+            "bus": self._bus.counts,
+        }
+
+    def restore(self, data: dict[str, Any]) -> None:
+        """Restores the histograms saved by as_dict"""
+        self._devices = {
+            int(addr): RttHistogram(counts)
+            for addr, counts in data.get("devices", {}).items()
+        }
+        self._bus = RttHistogram(data.get("bus"))
@@ -0,0 +1,21 @@
+"""Simulator of Pulsar-M meters on a TCP port or a pseudo terminal
+
+Exercises the integration without hardware:
+
+    python -m pulsar_simulator --tcp 127.0.0.1:4001 --meters 10000001-10000120
+
+then configure socket://127.0.0.1:4001 (or the printed pty path) as the port.
+"""
+from .bus import Faults, FrameSplitter, SimulatedBus
+from .meter import MeterError, VirtualMeter
+from .server import PtyPort, async_serve_tcp
+
+__all__ = [
+    "Faults",
+    "FrameSplitter",
+    "MeterError",
+    "PtyPort",
+    "SimulatedBus",
+    "VirtualMeter",
+    "async_serve_tcp",
+]
@@ -0,0 +1,97 @@
+"""Command line of the simulator"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+
+from custom_components.pulsar.discovery import parse_serial_ids
+
+from .bus import Faults, SimulatedBus
+from .meter import VirtualMeter
+from .server import PtyPort, async_serve_tcp
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m pulsar_simulator", description="Simulates a bus of Pulsar-M meters")
+    parser.add_argument("--tcp", metavar="HOST:PORT",
+                        help="serve the bus like a serial-to-TCP gateway")
+    parser.add_argument("--pty", action="store_true",
+                        help="serve the bus on a pseudo terminal (Linux)")
+    parser.add_argument("--meters", default="10000001",
+                        help="serial numbers and ranges, e.g. 10000001-10000120,10000200")
+    parser.add_argument("--channels", type=int, default=1)
+    parser.add_argument("--value-format", choices=("I", "f", "d"), default="I",
+                        help="encoding of channel values: uint32 (water meters), "
+                             "float32 (heat meters) or float64 (pulse counters)")
+    parser.add_argument("--flow", type=float, default=10.0,
+                        help="consumption of every channel in liters per hour")
+    parser.add_argument("--silent", default="",
+                        help="serial numbers of meters that never answer")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds before a meter answers")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="random extra latency up to this many seconds")
+    parser.add_argument("--baudrate", type=int, default=None,
+                        help="pace replies like a serial line of this speed")
+    parser.add_argument("--crc-error-rate", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--truncate-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+    if not args.tcp and not args.pty:
+        parser.error("give --tcp, --pty or both")
+    return args
+
+
+def make_bus(args: argparse.Namespace) -> SimulatedBus:
+    silent = set(parse_serial_ids(args.silent)) if args.silent else set()
+    faults = Faults(
+        latency=args.latency,
+        jitter=args.jitter,
+        baudrate=args.baudrate,
+        crc_error_rate=args.crc_error_rate,
+        drop_rate=args.drop_rate,
+        truncate_rate=args.truncate_rate)
+    meters = [
+        VirtualMeter(addr, args.channels, flow=[args.flow] * args.channels,
+                     value_format=args.value_format, silent=addr in silent)
+        for addr in parse_serial_ids(args.meters)
+    ]
+    return SimulatedBus(meters, faults, args.seed)
+
+
+async def async_main(args: argparse.Namespace) -> None:
+    bus = make_bus(args)
+    server = None
+    pty = None
+    if args.tcp:
+        host, _, port = args.tcp.rpartition(":")
+        server = await async_serve_tcp(bus, host or "127.0.0.1", int(port))
+        print(f"tcp: socket://{host or '127.0.0.1'}:{server.sockets[0].getsockname()[1]}")
+    if args.pty:
+        pty = PtyPort(bus)
+        print(f"pty: {pty.open()}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        if server is not None:
+            server.close()
+        if pty is not None:
+            pty.close()
+        print(f"{bus.requests} requests, {bus.replies} replies")
+
+
+def main() -> None:
+    args = parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+    try:
+        asyncio.run(async_main(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
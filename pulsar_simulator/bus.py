@@ -0,0 +1,152 @@
+"""A bus of virtual meters with configurable faults"""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Iterable
+from dataclasses import dataclass
+import logging
+import random
+import time
+
+from custom_components.pulsar import codec
+
+from .meter import MeterError, VirtualMeter
+
+_LOGGER = logging.getLogger(__name__)
+
+# start bit + 8 data bits + stop bit
+BITS_PER_BYTE = 10
+# silence after which an unfinished frame is thrown away, like a meter does
+FRAME_GAP = 0.2
+
+
+@dataclass
+class Faults:
+    """What goes wrong on the bus, rates are probabilities per reply"""
+
+    # delay before a meter starts to answer, in seconds
+    latency: float = 0.0
+    # random extra delay up to this many seconds
+    jitter: float = 0.0
+    # paces replies like a serial line of this speed, None sends at once
+    baudrate: int | None = None
+    crc_error_rate: float = 0.0
+    drop_rate: float = 0.0
+    truncate_rate: float = 0.0
+
+    def transfer_time(self, size: int) -> float:
+        if self.baudrate is None:
+            return 0.0
+        return size * BITS_PER_BYTE / self.baudrate
+
+
+class SimulatedBus():
+    """Routes request frames to the virtual meter they are addressed to
+
+    Like a real RS-485 line, a request with a bad CRC or for an address no
+    meter has goes unanswered. Faults apply to every meter, faults given
+    per address replace them for that meter.
+    """
+
+    def __init__(
+            self,
+            meters: Iterable[VirtualMeter] = (),
+            faults: Faults | None = None,
+            seed: int | None = None) -> None:
+        self.meters: dict[int, VirtualMeter] = {meter.addr: meter for meter in meters}
+        self.faults = faults or Faults()
+        self.meter_faults: dict[int, Faults] = {}
+        self.requests = 0
+        self.replies = 0
+        self._random = random.Random(seed)
+
+    def add_meter(self, meter: VirtualMeter, faults: Faults | None = None) -> None:
+        self.meters[meter.addr] = meter
+        if faults is not None:
+            self.meter_faults[meter.addr] = faults
+
+    def reply(self, request: bytes) -> tuple[bytes, Faults] | None:
+        """Builds the reply to a request frame, None if nobody answers"""
+        self.requests += 1
+        if len(request) < codec.SERVICE_SIZE or not codec.frame_crc_ok(request):
+            _LOGGER.debug(f"Ignoring corrupt request {bytes(request).hex()}")
+            return None
+
+        addr = codec.frame_addr(request)
+        meter = self.meters.get(addr)
+        if meter is None or meter.silent:
+            return None
+        faults = self.meter_faults.get(addr, self.faults)
+        if self._chance(faults.drop_rate):
+            return None
+
+        function = request[codec.FUNC_OFFSET]
+        request_id = codec.frame_request_id(request)
+        try:
+            payload = meter.handle(function, bytes(codec.frame_payload(request)))
+        except MeterError as ex:
+            function = codec.FUNCTION_ERROR
+            payload = bytes([ex.code])
+        except Exception:
+            _LOGGER.exception(f"Meter {addr} failed on {bytes(request).hex()}")
+            return None
+        frame = codec.encode_frame(payload, function, addr, request_id)
+
+        if self._chance(faults.crc_error_rate):
+            frame[-1] ^= 0xFF
+        if self._chance(faults.truncate_rate):
+            frame = frame[:self._random.randrange(1, len(frame))]
+        self.replies += 1
+        return bytes(frame), faults
+
+    async def async_reply(self, request: bytes) -> bytes | None:
+        """Builds the reply and waits as long as the meter and the line would take"""
+        reply = self.reply(request)
+        if reply is None:
+            return None
+        frame, faults = reply
+        delay = faults.latency + faults.transfer_time(len(request) + len(frame))
+        if faults.jitter:
+            delay += self._random.uniform(0, faults.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return frame
+
+    def _chance(self, rate: float) -> bool:
+        return rate > 0 and self._random.random() < rate
+
+
+class FrameSplitter():
+    """Cuts a byte stream into request frames using their length byte
+
+    Bytes that cannot start a frame are skipped one at a time, so the
+    splitter finds the next frame after line noise, and an unfinished
+    frame is thrown away once the line was silent for gap seconds.
+    """
+
+    def __init__(self, gap: float = FRAME_GAP) -> None:
+        self._buffer = bytearray()
+        self._gap = gap
+        self._last_data = 0.0
+
+    def feed(self, data: bytes) -> list[bytes]:
+        now = time.monotonic()
+        if now - self._last_data > self._gap:
+            self._buffer.clear()
+        self._last_data = now
+        self._buffer += data
+        frames = []
+        while len(self._buffer) >= codec.HEADER_SIZE:
+            size = self._buffer[codec.LEN_OFFSET]
+            if size < codec.SERVICE_SIZE:
+                del self._buffer[0]
+                continue
+            if len(self._buffer) < size:
+                break
+            frame = bytes(self._buffer[:size])
+            if not codec.frame_crc_ok(frame):
+                del self._buffer[0]
+                continue
+            frames.append(frame)
+            del self._buffer[:size]
+        return frames
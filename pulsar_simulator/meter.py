@@ -0,0 +1,190 @@
+"""Virtual Pulsar-M meters answering protocol functions"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+import datetime
+import struct
+
+from custom_components.pulsar import codec
+from custom_components.pulsar.archive import (
+    ARCHIVE_HEADER_SIZE,
+    MAX_ARCHIVE_RECORDS,
+    ArchiveType
+)
+from custom_components.pulsar.const import MAX_CHANNELS
+
+FUNCTION_READ_CURRENT = 0x01
+FUNCTION_READ_SYSTEM_TIME = 0x04
+FUNCTION_WRITE_SYSTEM_TIME = 0x05
+FUNCTION_READ_ARCHIVE = 0x06
+FUNCTION_READ_PARAMETERS = 0x0A
+FUNCTION_WRITE_PARAMETERS = 0x0B
+
+# error codes sent back with function 0
+ERROR_NO_FUNCTION = 0x01
+ERROR_BAD_REQUEST = 0x02
+ERROR_NO_PARAMETER = 0x03
+ERROR_NO_ARCHIVE = 0x04
+
+PARAM_DAYLIGHT_SAVING_TIME = 1
+PARAM_DIAG_FLAGS = 6
+PARAM_BATTERY_VOLTAGE = 10
+PARAM_TEMPERATURE = 11
+
+PARAM_SIZE = 8
+# replies of write functions carry a single status byte
+WRITE_OK = b'\x01'
+
+_FLOAT = struct.Struct('<f')
+_UINT32 = struct.Struct('<I')
+
+
+class MeterError(Exception):
+    """Request the meter answers with an error frame"""
+
+    def __init__(self, code: int) -> None:
+        super().__init__(f"meter error {code}")
+        self.code = code
+
+
+def float_param(value: float) -> bytes:
+    return _FLOAT.pack(value) + bytes(PARAM_SIZE - _FLOAT.size)
+
+
+def flag_param(value: int) -> bytes:
+    return bytes([value]) + bytes(PARAM_SIZE - 1)
+
+
+@dataclass
+class VirtualMeter:
+    """Water meter whose readings grow at a steady flow
+
+    The reading of a channel at a time is its initial value plus the flow
+    since start, so current values and archive records always agree.
+    Values are in liters, flows in liters per hour.
+    """
+
+    addr: int
+    channels: int = 1
+    initial: list[int] = field(default_factory=list)
+    flow: list[float] = field(default_factory=list)
+    start: datetime.datetime = field(
+        default_factory=lambda: datetime.datetime.now().replace(microsecond=0))
+    # meter clock minus local time
+    clock_offset: datetime.timedelta = datetime.timedelta()
+    params: dict[int, bytes] = field(default_factory=dict)
+    # struct format of channel values in current readings, as in the
+    # value_format of device profiles; archives always hold uint32
+    value_format: str = "I"
+    # a silent meter never answers, as if it was unplugged
+    silent: bool = False
+
+    def __post_init__(self) -> None:
+        if not 1 <= self.channels <= MAX_CHANNELS:
+            raise ValueError("wrong number of channels")
+        self.initial = (list(self.initial) + [0] * self.channels)[:self.channels]
+        self.flow = (list(self.flow) + [10.0] * self.channels)[:self.channels]
+        self.params = {
+            PARAM_DAYLIGHT_SAVING_TIME: flag_param(0),
+            PARAM_DIAG_FLAGS: flag_param(0),
+            PARAM_BATTERY_VOLTAGE: float_param(3.6),
+            PARAM_TEMPERATURE: float_param(21.5),
+            **self.params,
+        }
+
+    def clock(self, now: datetime.datetime | None = None) -> datetime.datetime:
+        if now is None:
+            now = datetime.datetime.now()
+        return (now + self.clock_offset).replace(microsecond=0)
+
+    def value(self, channel: int, time: datetime.datetime) -> int:
+        """Reading of a channel (numbered from 1) at a meter time"""
+        hours = max((time - self.start).total_seconds(), 0) / 3600
+        return int(self.initial[channel - 1] + self.flow[channel - 1] * hours) & 0xFFFFFFFF
+
+    def handle(self, function: int, payload: bytes, now: datetime.datetime | None = None) -> bytes:
+        """Returns the reply payload of a request, raises MeterError for an error reply"""
+        handler = self._HANDLERS.get(function)
+        if handler is None:
+            raise MeterError(ERROR_NO_FUNCTION)
+        return handler(self, payload, self.clock(now))
+
+    def _read_current(self, payload: bytes, time: datetime.datetime) -> bytes:
+        if len(payload) != 4:
+            raise MeterError(ERROR_BAD_REQUEST)
+        mask = _UINT32.unpack(payload)[0]
+        channels = [ch for ch in range(1, MAX_CHANNELS + 1) if mask & (1 << (ch - 1))]
+        if not channels or channels[-1] > self.channels:
+            raise MeterError(ERROR_BAD_REQUEST)
+        if self.value_format == "I":
+            return b''.join(_UINT32.pack(self.value(ch, time)) for ch in channels)
+        value = struct.Struct("<" + self.value_format)
+        return b''.join(value.pack(self.value(ch, time)) for ch in channels)
+
+    def _read_system_time(self, payload: bytes, time: datetime.datetime) -> bytes:
+        if payload:
+            raise MeterError(ERROR_BAD_REQUEST)
+        return bytes(codec.write_datetime(time, bytearray(6), 0))
+
+    def _write_system_time(self, payload: bytes, time: datetime.datetime) -> bytes:
+        if len(payload) != 6:
+            raise MeterError(ERROR_BAD_REQUEST)
+        try:
+            new_time = codec.read_datetime(payload, 0)
+        except ValueError as ex:
+            raise MeterError(ERROR_BAD_REQUEST) from ex
+        self.clock_offset += new_time - time
+        return WRITE_OK
+
+    def _read_archive(self, payload: bytes, time: datetime.datetime) -> bytes:
+        if len(payload) != 18:
+            raise MeterError(ERROR_BAD_REQUEST)
+        mask = _UINT32.unpack_from(payload, 0)[0]
+        try:
+            archive_type = ArchiveType(int.from_bytes(payload[4:6], 'little'))
+            first = archive_type.floor(codec.read_datetime(payload, 6))
+            last = archive_type.floor(codec.read_datetime(payload, 12))
+        except ValueError as ex:
+            raise MeterError(ERROR_NO_ARCHIVE) from ex
+        if mask == 0 or mask & (mask - 1) or mask.bit_length() > self.channels:
+            raise MeterError(ERROR_BAD_REQUEST)
+        records = archive_type.count(first, last)
+        if not 1 <= records <= MAX_ARCHIVE_RECORDS:
+            raise MeterError(ERROR_BAD_REQUEST)
+
+        channel = mask.bit_length()
+        reply = bytearray(ARCHIVE_HEADER_SIZE)
+        reply[:6] = payload[:6]
+        codec.write_datetime(first, reply, 6)
+        for i in range(records):
+            # a record holds the reading at the end of its period,
+            # records that are not closed yet read zero
+            end = archive_type.advance(first, i + 1)
+            reply += _UINT32.pack(self.value(channel, end) if end <= time else 0)
+        return bytes(reply)
+
+    def _read_parameters(self, payload: bytes, time: datetime.datetime) -> bytes:
+        if len(payload) != 2:
+            raise MeterError(ERROR_BAD_REQUEST)
+        value = self.params.get(int.from_bytes(payload, 'little'))
+        if value is None:
+            raise MeterError(ERROR_NO_PARAMETER)
+        return value
+
+    def _write_parameters(self, payload: bytes, time: datetime.datetime) -> bytes:
+        if len(payload) != 2 + PARAM_SIZE:
+            raise MeterError(ERROR_BAD_REQUEST)
+        code = int.from_bytes(payload[:2], 'little')
+        if code not in self.params:
+            raise MeterError(ERROR_NO_PARAMETER)
+        self.params[code] = bytes(payload[2:])
+        return WRITE_OK
+
+    _HANDLERS = {
+        FUNCTION_READ_CURRENT: _read_current,
+        FUNCTION_READ_SYSTEM_TIME: _read_system_time,
+        FUNCTION_WRITE_SYSTEM_TIME: _write_system_time,
+        FUNCTION_READ_ARCHIVE: _read_archive,
+        FUNCTION_READ_PARAMETERS: _read_parameters,
+        FUNCTION_WRITE_PARAMETERS: _write_parameters,
+    }
@@ -0,0 +1,99 @@
+"""Serves a simulated bus on a TCP port or a pseudo terminal"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+
+from .bus import FrameSplitter, SimulatedBus
+
+_LOGGER = logging.getLogger(__name__)
+
+
+async def async_serve_tcp(
+        bus: SimulatedBus, host: str = "127.0.0.1", port: int = 0) -> asyncio.Server:
+    """Serves the bus like a serial-to-TCP gateway
+
+    Every connection is a line of its own, its requests are answered one at
+    a time. Port 0 picks a free port, see server.sockets.
+    """
+
+    async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        splitter = FrameSplitter()
+        try:
+            while data := await reader.read(1024):
+                for request in splitter.feed(data):
+                    reply = await bus.async_reply(request)
+                    if reply is not None:
+                        writer.write(reply)
+                        await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(_handle, host, port)
+    _LOGGER.info(f"Serving {len(bus.meters)} meters on {server.sockets[0].getsockname()}")
+    return server
+
+
+class PtyPort():
+    """Serves the bus on a pseudo terminal whose path opens like a serial port
+
+    Linux only. The terminal side is kept open by the port itself, so a
+    client can close and reopen the path without ending the simulation.
+    """
+
+    def __init__(self, bus: SimulatedBus) -> None:
+        self._bus = bus
+        self._master: int | None = None
+        self._slave: int | None = None
+        self._splitter = FrameSplitter()
+        self._requests: asyncio.Queue[bytes] = asyncio.Queue()
+        self._worker: asyncio.Task | None = None
+        self.path: str | None = None
+
+    def open(self) -> str:
+        """Opens the terminal and returns its path"""
+        import tty
+
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        os.set_blocking(self._master, False)
+        self.path = os.ttyname(self._slave)
+
+        loop = asyncio.get_running_loop()
+        loop.add_reader(self._master, self._on_readable)
+        self._worker = loop.create_task(self._async_run())
+        _LOGGER.info(f"Serving {len(self._bus.meters)} meters on {self.path}")
+        return self.path
+
+    def _on_readable(self) -> None:
+        try:
+            data = os.read(self._master, 1024)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as ex:
+            _LOGGER.debug(f"Reading {self.path} failed: {ex}")
+            return
+        for request in self._splitter.feed(data):
+            self._requests.put_nowait(request)
+
+    async def _async_run(self) -> None:
+        while True:
+            request = await self._requests.get()
+            reply = await self._bus.async_reply(request)
+            if reply is not None:
+                os.write(self._master, reply)
+
+    def close(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        if self._master is not None:
+            asyncio.get_running_loop().remove_reader(self._master)
+            os.close(self._master)
+            self._master = None
+        if self._slave is not None:
+            os.close(self._slave)
+            self._slave = None
@@ -0,0 +1,34 @@
+"""Tests of the flow rate derived from counter readings"""
+from custom_components.pulsar.flow import FlowRate
+
+MINUTE = 60
+
+
+def test_late_polls_keep_a_short_window():
+    flow = FlowRate(MINUTE)
+    for i in range(10):
+        # a poll a minute, give or take a few seconds
+        now = i * MINUTE + (3 if i % 2 else -3)
+        flow.add(now, i * 10)
+        rate = flow.rate(now)
+    assert rate is not None
+    assert 10 / 70 < rate < 10 / 50
+
+
+def test_rate_ages_out_when_readings_stop():
+    flow = FlowRate(15 * MINUTE)
+    for i in range(5):
+        flow.add(i * MINUTE, i * 10)
+    assert flow.rate(4 * MINUTE) == 10 / MINUTE
+    assert flow.rate(10 * MINUTE) == 10 / MINUTE
+    assert flow.rate(20 * MINUTE) is None
+
+
+def test_gap_in_readings_starts_over():
+    flow = FlowRate(MINUTE)
+    flow.add(0, 0)
+    flow.add(MINUTE, 100)
+    flow.add(10 * MINUTE, 110)
+    assert flow.rate(10 * MINUTE) is None
+    flow.add(11 * MINUTE, 120)
+    assert flow.rate(11 * MINUTE) == 10 / MINUTE
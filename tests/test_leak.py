@@ -0,0 +1,43 @@
+"""Tests of the leak checks"""
+from custom_components.pulsar.leak import FLOW_GAP, LeakDetector, LeakSettings
+
+HOUR = 3600
+NOON = 12
+
+
+def _detector() -> LeakDetector:
+    return LeakDetector(LeakSettings(continuous_flow=HOUR, quiet_hours_start=0, quiet_hours_end=0))
+
+
+def test_flow_for_the_whole_window_raises_the_alarm():
+    detector = _detector()
+    for minute in range(61):
+        detector.add(minute * 60, NOON, minute)
+    assert detector.continuous_flow
+
+
+def test_gap_in_readings_is_not_counted_as_flow():
+    detector = _detector()
+    for minute in range(11):
+        detector.add(minute * 60, NOON, 100)
+
+    # the meter was not read for 4 hours, then shows a little use
+    now = 10 * 60 + 4 * HOUR
+    detector.add(now, NOON, 105)
+    assert not detector.continuous_flow
+
+    # flowing since the gap, but not for the whole window yet
+    for minute in range(1, 30):
+        detector.add(now + minute * 60, NOON, 105 + minute)
+    assert not detector.continuous_flow
+
+
+def test_gap_during_a_flow_restarts_it():
+    detector = _detector()
+    for minute in range(50):
+        detector.add(minute * 60, NOON, minute)
+
+    now = 49 * 60 + FLOW_GAP + 60
+    for minute in range(30):
+        detector.add(now + minute * 60, NOON, 100 + minute)
+    assert not detector.continuous_flow
@@ -0,0 +1,84 @@
+"""Tests of the reply timeouts learned from round trips"""
+from custom_components.pulsar.timeouts import (
+    LONG_PROBE_INTERVAL,
+    MAX_BACKOFF,
+    MIN_SAMPLES,
+    AdaptiveTimeouts,
+)
+
+INITIAL = 3.0
+FAST = 0.05
+SLOW = 0.3
+VERY_SLOW = 2.0
+
+
+def _request(timeouts: AdaptiveTimeouts, addr: int, rtt: float) -> bool:
+    """Sends a request to a meter that answers after rtt, returns if it was heard"""
+    if timeouts.timeout(addr) < rtt:
+        timeouts.record_timeout(addr)
+        return False
+    timeouts.record(addr, rtt)
+    return True
+
+
+def test_slow_meter_next_to_fast_one_is_heard():
+    timeouts = AdaptiveTimeouts(INITIAL)
+    for _ in range(20):
+        assert _request(timeouts, 1, FAST)
+    # the bus histogram is too short for the slow meter
+    assert timeouts.timeout(2) < SLOW
+
+    replies = 0
+    for _ in range(20):
+        _request(timeouts, 1, FAST)
+        replies += _request(timeouts, 2, SLOW)
+
+    assert replies >= 20 - 2
+    assert SLOW < timeouts.timeout(2) < INITIAL
+    assert timeouts.timeout(1) < SLOW
+
+
+def test_silent_meter_costs_a_few_learned_timeouts():
+    timeouts = AdaptiveTimeouts(INITIAL, ceiling=10.0)
+    for _ in range(MIN_SAMPLES):
+        timeouts.record(1, FAST)
+    learned = timeouts.timeout(1)
+
+    waited = []
+    for _ in range(LONG_PROBE_INTERVAL - 1):
+        waited.append(timeouts.timeout(2))
+        timeouts.record_timeout(2)
+
+    assert max(waited) == learned * MAX_BACKOFF
+    assert sum(waited) < 1.0
+    # then one long probe and short timeouts again
+    assert timeouts.timeout(2) == 10.0
+    timeouts.record_timeout(2)
+    assert timeouts.timeout(2) == learned * MAX_BACKOFF
+    assert timeouts.timeout(1) == learned
+
+
+def test_meter_slower_than_the_bus_is_learned_from_a_long_probe():
+    timeouts = AdaptiveTimeouts(INITIAL, ceiling=10.0)
+    for _ in range(MIN_SAMPLES):
+        timeouts.record(1, FAST)
+
+    heard = [_request(timeouts, 2, VERY_SLOW) for _ in range(LONG_PROBE_INTERVAL)]
+    assert heard == [False] * (LONG_PROBE_INTERVAL - 1) + [True]
+
+    assert all(_request(timeouts, 2, VERY_SLOW) for _ in range(10))
+    assert VERY_SLOW < timeouts.timeout(2) < 10.0
+
+
+def test_meter_with_own_histogram_backs_off_a_few_times_only():
+    timeouts = AdaptiveTimeouts(INITIAL)
+    for _ in range(MIN_SAMPLES):
+        timeouts.record(1, FAST)
+    learned = timeouts.timeout(1)
+
+    for _ in range(10):
+        timeouts.record_timeout(1)
+
+    assert timeouts.timeout(1) == learned * 4
+    timeouts.record(1, FAST)
+    assert timeouts.timeout(1) == learned